@@ -3,11 +3,13 @@
 import logging
 import json
 
-from homeassistant.core import HomeAssistant, Config
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Config, Event, HomeAssistant
 
-from .const import DOMAIN
+from .const import DOMAIN, PLANNER_GREEDY
 from .battery_planner import BatteryPlanner
 from .battery import Battery
+from .plan_cache import PlanCache
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -52,8 +54,22 @@ async def _create_battery_planner_and_add_to_hass(
         battery_planner = BatteryPlanner(
             hass=hass,
             battery=battery,
+            slot_minutes=config.get("slot_minutes", 60),
+            plan_cache=PlanCache(
+                max_size=config.get("plan_cache_size", 8),
+                soc_tolerance=config.get("plan_cache_soc_tolerance", 1.0),
+            ),
+            max_daily_cycles=config.get("max_daily_cycles", 2),
+            reschedule_window=config.get("reschedule_window", 0),
+            min_yield_improvement=config.get("min_yield_improvement", 0),
+            active_plan_ttl=config.get("active_plan_ttl", 5),
         )
         hass.data[DOMAIN] = battery_planner
+
+        async def async_shutdown(event: Event) -> None:
+            await battery_planner.shutdown()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_shutdown)
         _LOGGER.debug("Added %s (version %s) to hass.data", DOMAIN, VERSION)
     return True
 
@@ -74,6 +90,9 @@ async def async_setup(hass: HomeAssistant, hass_config: Config) -> bool:
     #     battery_cycle_cost: 80
     #     price_margin: 20
     #     low_price_threshold: 20
+    #     planner: greedy
+    #     incremental: false
+    #     time_budget: 0
     async def service_call_reschedule(service_call):
         """Get future prices and create new schedule"""
         _LOGGER.debug("%s: service_call_reschedule", DOMAIN)
@@ -93,13 +112,19 @@ async def async_setup(hass: HomeAssistant, hass_config: Config) -> bool:
         battery_cycle_cost: float = service_call.data.get("battery_cycle_cost", 0)
         price_margin: float = service_call.data.get("price_margin", 0)
         low_price_threshold: float = service_call.data.get("low_price_threshold", 0)
-        await battery_planner.reschedule(
+        planner_engine: str = service_call.data.get("planner", PLANNER_GREEDY)
+        incremental: bool = service_call.data.get("incremental", False)
+        time_budget: float = service_call.data.get("time_budget", 0)
+        await battery_planner.request_reschedule(
             battery_soc,
             import_prices_today + import_prices_tomorrow,
             export_prices_today + export_prices_tomorrow,
             battery_cycle_cost,
             price_margin,
             low_price_threshold,
+            planner_engine,
+            incremental,
+            time_budget,
         )
 
     async def service_call_stop(service_call):
@@ -0,0 +1,179 @@
+"""Anytime planner module"""
+
+import logging
+from time import perf_counter
+from typing import Callable
+
+from .battery import Battery
+from .charge_plan import ChargePlan
+from .optimal_planner import OptimalPlanner
+from .planner import Planner, _is_feasible
+from .trade_planner import TradePlanner
+
+_LOGGER = logging.getLogger(__name__)
+
+# Energy resolutions (Wh) of the optimal planner refinements, from coarse to fine
+REFINEMENT_RESOLUTIONS = (100, 30, 10)
+# Measured time of the trade planner relative to the greedy planner, and of the
+# optimal planner relative to the trade planner, rounded up
+TRADE_RELATIVE_COST = 1.5
+OPTIMAL_RELATIVE_COST = 3.0
+
+
+class AnytimePlanner(Planner):
+    """Planner that creates a greedy plan first, and then refines it with more
+    expensive planners for as long as the time budget allows
+
+    The refinements are run from the cheapest to the most expensive: the trade
+    planner and then the optimal planner at finer and finer energy resolution. A
+    refinement is only started if it is expected to finish before the deadline,
+    based on the time of the previous one. The feasible plan with the highest
+    expected yield is returned, so the result is never worse than the greedy plan.
+    A plan that goes outside the power or SoC limits of the battery reports a
+    yield it cannot reach, so it is not used unless no plan is feasible."""
+
+    _time_budget: float
+    _refinements: list[Planner]
+
+    def __init__(
+        self,
+        battery_cycle_cost: float = 0,
+        price_margin: float = 0,
+        low_price_threshold: float = 0,
+        time_budget: float = 1.0,
+        max_daily_cycles: int = 2,
+        slot_minutes: int = 60,
+    ):
+        """time_budget - (s) Time to spend on refinements after the greedy plan"""
+        super().__init__(
+            battery_cycle_cost, price_margin, low_price_threshold, slot_minutes
+        )
+        self._time_budget = time_budget
+        self._refinements = [
+            TradePlanner(
+                battery_cycle_cost,
+                price_margin,
+                low_price_threshold,
+                max_daily_cycles=max_daily_cycles,
+                slot_minutes=slot_minutes,
+            )
+        ] + [
+            OptimalPlanner(
+                battery_cycle_cost,
+                price_margin,
+                low_price_threshold,
+                resolution=resolution,
+                slot_minutes=slot_minutes,
+            )
+            for resolution in REFINEMENT_RESOLUTIONS
+        ]
+        self._statistics.update(
+            {"refinements": 0, "refined_plans": 0, "refinements_out_of_time": 0}
+        )
+
+    def set_cancel_check(self, is_cancelled: Callable[[], bool]) -> None:
+        """Set a function that returns True when the plan being created is no longer
+        wanted, it is also used by the refinements"""
+        super().set_cancel_check(is_cancelled)
+        for refinement in self._refinements:
+            refinement.set_cancel_check(is_cancelled)
+
+    def get_settings(self) -> tuple:
+        """Get the settings that the created plans depend on"""
+        return super().get_settings() + (
+            self._time_budget,
+            self._refinements[0].get_settings(),
+        )
+
+    def create_price_arbitrage_plan(
+        self,
+        battery: Battery,
+        import_prices: list[float],
+        export_prices: list[float],
+        start_hour: int = 0,
+    ) -> ChargePlan:
+        """Charge plan is created for the period specified by the provided hours
+
+        The greedy plan is always created, even if it takes longer than the time
+        budget, then the refinements are run until the deadline"""
+        start = perf_counter()
+        deadline = start + self._time_budget
+        greedy_plan = super().create_price_arbitrage_plan(
+            battery.clone(), import_prices, export_prices, start_hour
+        )
+        previous_duration = perf_counter() - start
+        best_plan: ChargePlan | None = None
+        if _is_feasible(greedy_plan, battery):
+            best_plan = greedy_plan
+        _LOGGER.debug(
+            "Greedy plan created in %.1f ms, expected yield = %.2f, feasible = %s",
+            previous_duration * 1000,
+            greedy_plan.expected_yield(),
+            best_plan is not None,
+        )
+
+        previous_refinement: Planner = self
+        refined = False
+        for refinement in self._refinements:
+            expected_duration = previous_duration * _relative_cost(
+                previous_refinement, refinement
+            )
+            if perf_counter() + expected_duration > deadline:
+                _LOGGER.debug(
+                    "Not enough time left for %s, %.1f ms expected",
+                    refinement.get_settings(),
+                    expected_duration * 1000,
+                )
+                self._statistics["refinements_out_of_time"] += 1
+                break
+
+            refinement_start = perf_counter()
+            charge_plan = refinement.create_price_arbitrage_plan(
+                battery.clone(), import_prices, export_prices, start_hour
+            )
+            previous_duration = perf_counter() - refinement_start
+            previous_refinement = refinement
+            self._statistics["refinements"] += 1
+            feasible = _is_feasible(charge_plan, battery)
+            # Gain over the best feasible plan so far, or over the greedy plan if
+            # no plan has been feasible yet
+            gain = (
+                charge_plan.expected_yield()
+                - (best_plan if best_plan is not None else greedy_plan).expected_yield()
+            )
+            _LOGGER.debug(
+                "Refinement %s took %.1f ms, expected yield = %.2f (gain %.2f), "
+                "feasible = %s",
+                refinement.get_settings(),
+                previous_duration * 1000,
+                charge_plan.expected_yield(),
+                gain,
+                feasible,
+            )
+            if feasible and (best_plan is None or gain > 0):
+                best_plan = charge_plan
+                refined = True
+
+        if best_plan is None:
+            _LOGGER.debug("No feasible plan was found in time, using the greedy plan")
+            best_plan = greedy_plan
+        elif refined:
+            self._statistics["refined_plans"] += 1
+        _LOGGER.debug(
+            "Anytime planning done in %.1f ms, expected yield = %.2f",
+            (perf_counter() - start) * 1000,
+            best_plan.expected_yield(),
+        )
+        return best_plan
+
+
+def _relative_cost(previous: Planner, planner: Planner) -> float:
+    """Expected time of planning with planner, relative to the previous planner
+
+    The time of the optimal planner grows slower than the number of energy states,
+    since a part of it is the same for any resolution"""
+    if isinstance(planner, OptimalPlanner):
+        if isinstance(previous, OptimalPlanner):
+            return (previous.get_resolution() / planner.get_resolution()) ** 0.5
+        return OPTIMAL_RELATIVE_COST
+    return TRADE_RELATIVE_COST
@@ -2,89 +2,180 @@
 
 import logging
 import hashlib
+import json
 import re
-from typing import Callable
+import secrets
+from time import perf_counter
 
-import requests
-from requests import Response
-
-from homeassistant.core import HomeAssistant
+import aiohttp
+from multidict import CIMultiDictProxy
 
 from ...const import GET, POST, REQUEST_TIMEOUT
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class Response:
+    """Status, headers and body of a response, that can be used after the
+    connection has been released back to the pool"""
+
+    status_code: int
+    headers: CIMultiDictProxy[str]
+    content: bytes
+    _response: aiohttp.ClientResponse
+
+    def __init__(self, response: aiohttp.ClientResponse, content: bytes):
+        self.status_code = response.status
+        self.headers = response.headers
+        self.content = content
+        self._response = response
+
+    def json(self):
+        """Get the body parsed as JSON"""
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """Raise aiohttp.ClientResponseError if the status is 400 or higher"""
+        self._response.raise_for_status()
+
+
 class DigestAuthRequest:
     """Create HTTP requests usig digest authorization.
     For some reason the HTTPDigestAuth from requests.auth does
-    not work with Fronius Solarnet. That's why this class was created."""
+    not work with Fronius Solarnet. That's why this class was created.
+
+    The requests are sent with aiohttp on a session that keeps the connections to
+    the host alive, so that a new connection is not opened for every request.
+
+    The last challenge is kept and reused with an increasing nonce count, so a new
+    challenge is only needed when the server rejects the nonce as stale."""
 
     _host: str
     _username: str
     _password: str
     _auth_data: dict[str, str]
-
-    def __init__(self, host: str, username: str, password: str, hass: HomeAssistant):
+    _nonce_count: int
+    _ha1_by_realm: dict[str, str]
+    _timeout: aiohttp.ClientTimeout
+    _pool_size: int
+    _session: aiohttp.ClientSession | None
+    _statistics: dict[str, float]
+
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        timeout: float = REQUEST_TIMEOUT,
+        pool_size: int = 2,
+    ):
+        """timeout - (s) Max time of each request
+        pool_size - Max number of open connections to the host"""
         self._host = host
         self._username = username
         self._password = password
         self._auth_data = {}
-        self._hass = hass
+        self._nonce_count = 0
+        self._ha1_by_realm = {}
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._pool_size = pool_size
+        self._session = None
+        self._statistics = {
+            "requests": 0,
+            "round_trips": 0,
+            "challenges": 0,
+            "stale_nonces": 0,
+            "average_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+        }
+
+    def get_statistics(self) -> dict[str, float]:
+        """Get number of requests and the HTTP round trips needed for them, the
+        number of 401 challenges and how many of them rejected a used nonce,
+        and the latency of the requests"""
+        return dict(self._statistics)
+
+    async def close(self) -> None:
+        """Close the session and its connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     async def get(self, digest_uri: str) -> Response:
         """GET request"""
-        request_type = GET
-
-        def request_builder(url, headers) -> Callable:
-            def request():
-                _LOGGER.debug("%s %s with headers=%s", GET, url, headers)
-                return requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-
-            return request
-
-        return await self._send_async(digest_uri, request_type, request_builder)
-
-    async def post_json(self, digest_uri: str, payload: object = None) -> Response:
-        """POST request with JSON data"""
-        request_type = POST
+        return await self._send_async(digest_uri, GET)
 
-        def request_builder(url, headers) -> Callable:
-            def request():
-                _LOGGER.debug("%s %s with headers=%s", POST, url, headers)
-                return requests.post(
-                    url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT
-                )
-
-            return request
-
-        return await self._send_async(digest_uri, request_type, request_builder)
+    async def post_json(self, digest_uri: str, payload: str) -> Response:
+        """POST request with JSON data, where payload is the serialized JSON"""
+        return await self._send_async(
+            digest_uri, POST, payload, {"Content-Type": "application/json"}
+        )
 
     async def _send_async(
-        self, digest_uri: str, request_type: str, request_builder: Callable
-    ):
-        url = f"{self._host}{digest_uri}"
-
-        headers = self._create_headers(digest_uri, request_type)
-
-        response: Response = await self._hass.async_add_executor_job(
-            request_builder(url, headers)
-        )
+        self,
+        digest_uri: str,
+        request_type: str,
+        data: str | None = None,
+        extra_headers: dict[str, str] | None = None,
+    ) -> Response:
+        start = perf_counter()
+        response = await self._request(digest_uri, request_type, data, extra_headers)
 
         if response.status_code == 401:
+            self._statistics["challenges"] += 1
+            if self._auth_data:
+                _LOGGER.debug("Nonce rejected by %s, using the new one", self._host)
+                self._statistics["stale_nonces"] += 1
             self._auth_data = parse_auth_data_from_response(response)
-            headers = self._create_headers(digest_uri, request_type)
-
-            response = await self._hass.async_add_executor_job(
-                request_builder(url, headers)
+            self._nonce_count = 0
+            response = await self._request(
+                digest_uri, request_type, data, extra_headers
             )
 
+        self._add_latency((perf_counter() - start) * 1000)
         response.raise_for_status()
         return response
 
+    async def _request(
+        self,
+        digest_uri: str,
+        request_type: str,
+        data: str | None,
+        extra_headers: dict[str, str] | None,
+    ) -> Response:
+        url = f"{self._host}{digest_uri}"
+        headers = self._create_headers(digest_uri, request_type)
+        _LOGGER.debug("%s %s with headers=%s", request_type, url, headers)
+        if extra_headers:
+            headers.update(extra_headers)
+
+        self._statistics["round_trips"] += 1
+        async with self._get_session().request(
+            request_type, url, headers=headers, data=data
+        ) as response:
+            content = await response.read()
+        return Response(response, content)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self._pool_size),
+                timeout=self._timeout,
+            )
+        return self._session
+
+    def _add_latency(self, latency_ms: float) -> None:
+        statistics = self._statistics
+        statistics["requests"] += 1
+        statistics["average_latency_ms"] += (
+            latency_ms - statistics["average_latency_ms"]
+        ) / statistics["requests"]
+        statistics["max_latency_ms"] = max(statistics["max_latency_ms"], latency_ms)
+
     def _create_headers(self, digest_uri: str, request_type: str):
         headers = {}
         if self._auth_data:
+            self._nonce_count += 1
             headers = {
                 "Authorization": create_auth_header(
                     request_type,
@@ -92,10 +183,20 @@ class DigestAuthRequest:
                     digest_uri,
                     self._username,
                     self._password,
+                    nonce_count=self._nonce_count,
+                    ha1=self._get_ha1(self._auth_data),
                 )
             }
         return headers
 
+    def _get_ha1(self, auth_data: dict[str, str]) -> str:
+        realm = auth_data["realm"]
+        if realm not in self._ha1_by_realm:
+            self._ha1_by_realm[realm] = create_ha1(
+                auth_data["algorithm"], self._username, realm, self._password
+            )
+        return self._ha1_by_realm[realm]
+
 
 def create_auth_header(
     method: str,
@@ -103,21 +204,27 @@ def create_auth_header(
     digest_uri: str,
     username: str,
     password: str,
+    nonce_count: int = 1,
+    ha1: str | None = None,
 ) -> str:
-    """Create headers for digest auth request"""
+    """Create headers for digest auth request
+
+    nonce_count - Number of requests sent with the nonce, including this one
+    ha1 - Precomputed hash of the credentials, computed from them if None"""
 
     realm = auth_data["realm"]
     algorithm = auth_data["algorithm"]
     nonce = auth_data["nonce"]
     qop = auth_data["qop"]
-    nonce_count = "00000001"
-    cnonce = "NaN"
+    nc = f"{nonce_count:08x}"
+    cnonce = secrets.token_hex(8)
 
+    if ha1 is None:
+        ha1 = create_ha1(algorithm, username, realm, password)
     if algorithm == "MD5":
-        ha1 = hashlib.md5(f"{username}:{realm}:{password}".encode()).hexdigest()
         ha2 = hashlib.md5(f"{method}:{digest_uri}".encode()).hexdigest()
         response = hashlib.md5(
-            f"{ha1}:{nonce}:{nonce_count}:{cnonce}:{qop}:{ha2}".encode()
+            f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}".encode()
         ).hexdigest()
         auth_header = (
             f"Digest "
@@ -127,7 +234,7 @@ def create_auth_header(
             f"uri={digest_uri}, "
             f"response={response}, "
             f"qop={qop}, "
-            f"nc={nonce_count}, "
+            f"nc={nc}, "
             f"cnonce={cnonce}"
         )
     else:
@@ -135,6 +242,13 @@ def create_auth_header(
     return auth_header
 
 
+def create_ha1(algorithm: str, username: str, realm: str, password: str) -> str:
+    """Hash of the credentials, the same for all requests to the realm"""
+    if algorithm != "MD5":
+        raise ValueError(f'Algorithm "{algorithm}" not supported')
+    return hashlib.md5(f"{username}:{realm}:{password}".encode()).hexdigest()
+
+
 def parse_auth_data_from_response(response: Response) -> dict[str, str]:
     """Extract auth data from response"""
     auth_data = {}
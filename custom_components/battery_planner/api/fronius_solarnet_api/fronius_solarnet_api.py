@@ -1,6 +1,13 @@
 """Fronius Solarnet API"""
 
-from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+from datetime import datetime, time, timedelta
+from time import monotonic
+from typing import Awaitable, Callable, TypeVar
+
+import aiohttp
 
 from homeassistant.core import HomeAssistant
 
@@ -9,6 +16,15 @@ from .solarnet_charge_schedule import SolarnetChargeSchedule
 from ...battery_api_interface import BatteryApiInterface
 from ...charge_plan import ChargePlan
 from ...charge_hour import ChargeHour
+from ...const import REQUEST_TIMEOUT
+from ...time_base import TimeBase
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# Status of a request that was rejected since the user is not logged in
+_AUTH_FAILURE_STATUSES = (401, 403)
 
 
 class FroniusSolarnetApi(BatteryApiInterface):
@@ -20,43 +36,107 @@ class FroniusSolarnetApi(BatteryApiInterface):
 
     _solarnet: DigestAuthRequest
     _username: str
+    _session_lifetime: float
+    _session_expiry: float
+    _login_lock: asyncio.Lock
+    _statistics: dict[str, int]
 
     def __init__(self, secrets_json: dict[str, str], hass: HomeAssistant):
         super().__init__(secrets_json, hass)
         host = f"http://{secrets_json.get('host')}"
         username = str(secrets_json.get("username"))
         password = str(secrets_json.get("password"))
-        self._solarnet = DigestAuthRequest(host, username, password, hass)
+        self._solarnet = DigestAuthRequest(
+            host,
+            username,
+            password,
+            timeout=float(secrets_json.get("request_timeout", REQUEST_TIMEOUT)),
+            pool_size=int(secrets_json.get("connection_pool_size", 2)),
+        )
         self._username = username
+        self._session_lifetime = float(secrets_json.get("session_lifetime", 300))
+        self._session_expiry = 0.0
+        self._login_lock = asyncio.Lock()
+        self._statistics = {
+            "logins": 0,
+            "relogins": 0,
+            "posts": 0,
+            "posts_skipped": 0,
+            "post_bytes": 0,
+            "entries_posted": 0,
+        }
+
+    def get_statistics(self) -> dict:
+        """Get number of logins and how many of them were made since a request was
+        rejected, number of POST requests and the size of them, the number of
+        POST requests that were skipped since the schedule was not changed,
+        and the number and latency of the HTTP requests"""
+        return {**self._statistics, "http": self._solarnet.get_statistics()}
+
+    async def close(self) -> None:
+        """Close the connections to the inverter"""
+        await self._solarnet.close()
 
     async def _login(self) -> bool:
         """Login the user to be able to read and write schedules"""
         digest_uri = f"{self._LOGIN_URI}?user={self._username}"
         response = await self._solarnet.get(digest_uri)
+        self._statistics["logins"] += 1
         return response.status_code == 200
 
+    async def _ensure_login(self) -> None:
+        """Login unless the session is still valid, concurrent operations wait
+        for the same login"""
+        async with self._login_lock:
+            if monotonic() < self._session_expiry:
+                return
+            if await self._login():
+                self._session_expiry = monotonic() + self._session_lifetime
+
+    async def _logged_in(self, operation: Callable[[], Awaitable[_T]]) -> _T:
+        """Run the operation in a logged in session, login again and retry once if
+        the operation is rejected since the session has expired on the inverter"""
+        await self._ensure_login()
+        try:
+            result = await operation()
+        except aiohttp.ClientResponseError as error:
+            if error.status not in _AUTH_FAILURE_STATUSES:
+                raise
+            _LOGGER.debug("Request rejected with %s, logging in again", error.status)
+            self._session_expiry = 0.0
+            self._statistics["relogins"] += 1
+            await self._ensure_login()
+            result = await operation()
+        # The session on the inverter is extended by each request
+        self._session_expiry = max(
+            self._session_expiry, monotonic() + self._session_lifetime
+        )
+        return result
+
     async def schedule_battery(self, new_charge_plan: ChargePlan) -> bool:
         """Create new schedule for the battery
         The input dict is {hour: power(W)}, e.g. {3:-2000} or {17:3000}
         where a negative power value is charging battery and positive is discharging
 
-        Returns True if the scheduling succeeded"""
-
-        await self._login()
+        Returns True if the scheduling succeeded, also if the inverter already had
+        the same schedule so that nothing had to be sent"""
+        return await self._logged_in(lambda: self._schedule_battery(new_charge_plan))
 
-        solarnet_schedules: dict[
-            datetime, SolarnetChargeSchedule
-        ] = await self._active_schedules_for_today()
+    async def _schedule_battery(self, new_charge_plan: ChargePlan) -> bool:
+        active_schedules = await self._get_solarnet_schedules()
+        slot_powers = self._slot_powers_for_today(active_schedules)
 
-        scheduled_hours: dict[str, ChargeHour] = new_charge_plan.get_hours_dict()
-        for hour_iso, charge_hour in scheduled_hours.items():
-            self._add_schedules_for_hour(
-                solarnet_schedules,
-                charge_hour.get_time(),
-                charge_hour.get_power(),
+        for charge_hour in new_charge_plan.get_hours_list():
+            slot_powers[charge_hour.get_time()] = _powers_by_schedule_type(
+                charge_hour.get_power()
             )
 
-        return await self._post_schedule(list(solarnet_schedules.values()))
+        new_schedules = self._merge_slots(slot_powers)
+        if _same_schedules(new_schedules, active_schedules):
+            _LOGGER.info("The inverter already has the new schedule, not posting it")
+            self._statistics["posts_skipped"] += 1
+            return True
+        return await self._post_schedule(new_schedules)
 
     async def _post_schedule(self, solarnet_schedules: list[SolarnetChargeSchedule]):
         solarnet_schedules_json = []
@@ -64,61 +144,92 @@ class FroniusSolarnetApi(BatteryApiInterface):
             solarnet_schedules_json.append(solarnet_schedule.tojsondict())
 
         json_data = {self._TIMEOFUSE_JSON_OBJECT: solarnet_schedules_json}
-        response = await self._solarnet.post_json(
-            self._TIMEOFUSE_URI, payload=json_data
-        )
+        # Without whitespace, since the whole list is sent every time
+        payload = json.dumps(json_data, separators=(",", ":"))
+        response = await self._solarnet.post_json(self._TIMEOFUSE_URI, payload)
 
+        self._statistics["posts"] += 1
+        self._statistics["post_bytes"] += len(payload)
+        self._statistics["entries_posted"] += len(solarnet_schedules)
+        _LOGGER.debug(
+            "Posted %s time of use entries (%s bytes)",
+            len(solarnet_schedules),
+            len(payload),
+        )
         return response.status_code == 200
 
-    def _add_schedules_for_hour(
-        self,
-        solarnet_schedules: dict[datetime, SolarnetChargeSchedule],
-        hour_dt: datetime,
-        power: int,
-    ):
-        schedule_type_min = SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MIN
-        schedule_type_max = SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX
-        if power < 0:
-            schedule_type_min = SolarnetChargeSchedule.SCHEDULE_TYPE_CHARGE_MIN
-            schedule_type_max = SolarnetChargeSchedule.SCHEDULE_TYPE_CHARGE_MAX
-
-        solarnet_schedules[hour_dt] = SolarnetChargeSchedule(
-            hour_dt, power
-        ).set_schedule_type(schedule_type_min)
-        solarnet_schedules[hour_dt + timedelta(seconds=1)] = SolarnetChargeSchedule(
-            hour_dt, power
-        ).set_schedule_type(schedule_type_max)
-
-    async def _active_schedules_for_today(
-        self,
-    ) -> dict[datetime, SolarnetChargeSchedule]:
-        todays_schedules = {}
-        today_weekday = datetime.now().weekday()
-        active_schedules = await self._get_solarnet_schedules()
+    def _slot_powers_for_today(
+        self, active_schedules: list[SolarnetChargeSchedule]
+    ) -> dict[datetime, dict[str, int]]:
+        """Split the active schedules of today into slots, as the power of each
+        schedule type at the start of each slot"""
+        slot_powers: dict[datetime, dict[str, int]] = {}
+        today = datetime.now().date()
         for active_schedule in active_schedules:
-            if today_weekday == active_schedule.get_weekday_index():
-                if active_schedule.get_hour() in todays_schedules:
-                    todays_schedules[
-                        active_schedule.get_hour().replace(second=1)
-                    ] = active_schedule
-                else:
-                    todays_schedules[active_schedule.get_hour()] = active_schedule
-        return todays_schedules
+            if today.weekday() not in active_schedule.get_weekday_indexes():
+                continue
+            for hour in active_schedule.get_hours(self._slot_minutes):
+                if hour.date() == today:
+                    slot_powers.setdefault(hour, {})[
+                        active_schedule.get_schedule_type()
+                    ] = active_schedule.get_power()
+        return slot_powers
+
+    def _merge_slots(
+        self, slot_powers: dict[datetime, dict[str, int]]
+    ) -> list[SolarnetChargeSchedule]:
+        """Create one schedule for each range of consecutive slots of the same day
+        that have the same power for a schedule type, where ranges that are the same
+        on several days are one schedule for all of those weekdays"""
+        slot_length = timedelta(minutes=self._slot_minutes)
+        solarnet_schedules: list[SolarnetChargeSchedule] = []
+        # Start, end and power of the range being merged, for each schedule type
+        ranges: dict[str, tuple[datetime, datetime, int]] = {}
+
+        def add_schedule(schedule_type: str) -> None:
+            start, end, power = ranges.pop(schedule_type)
+            solarnet_schedules.append(
+                SolarnetChargeSchedule(start, power, end - start).set_schedule_type(
+                    schedule_type
+                )
+            )
+
+        for hour in sorted(slot_powers):
+            for schedule_type, power in slot_powers[hour].items():
+                if schedule_type in ranges:
+                    start, end, range_power = ranges[schedule_type]
+                    if (
+                        end == hour
+                        and range_power == power
+                        and start.date() == hour.date()
+                    ):
+                        ranges[schedule_type] = (start, hour + slot_length, power)
+                        continue
+                    add_schedule(schedule_type)
+                ranges[schedule_type] = (hour, hour + slot_length, power)
+        for schedule_type in list(ranges):
+            add_schedule(schedule_type)
+        return _merge_weekdays(solarnet_schedules)
 
     async def get_active_charge_plan(self) -> ChargePlan:
         """Fetch the active charge plan from the inverter"""
-        await self._login()
-        active_schedules = await self._get_solarnet_schedules()
+        active_schedules = await self._logged_in(self._get_solarnet_schedules)
 
-        charge_plan = ChargePlan()
+        time_base = TimeBase.today(self._slot_minutes)
+        charge_plan = ChargePlan(time_base)
         for solarnet_schedule in active_schedules:
-            charge_hour = ChargeHour.from_dt(
-                solarnet_schedule.get_hour(),
-                0.0,
-                0.0,
-                solarnet_schedule.get_power(),
-            )
-            charge_plan.add_charge_hour(charge_hour)
+            for hour in solarnet_schedule.get_hours(self._slot_minutes):
+                if not 0 <= time_base.index_of(hour) < 2 * time_base.slots_per_day():
+                    # Only today and tomorrow can be in a charge plan
+                    continue
+                charge_hour = ChargeHour.from_dt(
+                    hour,
+                    0.0,
+                    0.0,
+                    solarnet_schedule.get_power(),
+                    time_base,
+                )
+                charge_plan.add_charge_hour(charge_hour)
 
         return charge_plan
 
@@ -135,28 +246,65 @@ class FroniusSolarnetApi(BatteryApiInterface):
     async def stop(self) -> bool:
         """Stop the battery by scheduling 0 power for all times
         Return True if successful"""
-        schedules = []
-        now = datetime.now()
-        for weekday_index in SolarnetChargeSchedule.WEEK_DAYS:
-            for hour in range(24):
-                hour_dt = now.replace(hour=hour, minute=0)
-                schedules.append(
-                    SolarnetChargeSchedule(hour_dt, 0)
-                    .set_schedule_type(
-                        SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MIN
-                    )
-                    .set_weekday_index(weekday_index)
-                )
-                schedules.append(
-                    SolarnetChargeSchedule(hour_dt, 0)
-                    .set_schedule_type(
-                        SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX
-                    )
-                    .set_weekday_index(weekday_index)
-                )
-        return await self._post_schedule(schedules)
+        midnight = datetime.combine(datetime.now().date(), time(0))
+        schedule = (
+            SolarnetChargeSchedule(midnight, 0, timedelta(days=1))
+            .set_schedule_type(SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX)
+            .set_weekday_indexes(SolarnetChargeSchedule.WEEK_DAYS)
+        )
+        return await self._logged_in(lambda: self._post_schedule([schedule]))
 
     async def clear(self) -> bool:
         """Clear the battery schedule
         Return True if successful"""
-        return await self._post_schedule([])
+        return await self._logged_in(lambda: self._post_schedule([]))
+
+
+def _powers_by_schedule_type(power: int) -> dict[str, int]:
+    """Get the power of the schedules to run the battery at the given power"""
+    if power == 0:
+        # A min discharge power of 0 W is no limit, only the max entry is needed
+        return {SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX: 0}
+    if power < 0:
+        return {
+            SolarnetChargeSchedule.SCHEDULE_TYPE_CHARGE_MIN: power,
+            SolarnetChargeSchedule.SCHEDULE_TYPE_CHARGE_MAX: power,
+        }
+    return {
+        SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MIN: power,
+        SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX: power,
+    }
+
+
+def _merge_weekdays(
+    solarnet_schedules: list[SolarnetChargeSchedule],
+) -> list[SolarnetChargeSchedule]:
+    """Merge schedules that only differ by weekday into one schedule for all of
+    the weekdays, keeping the order of the first schedule of each"""
+    merged_schedules: dict[str, SolarnetChargeSchedule] = {}
+    for solarnet_schedule in solarnet_schedules:
+        schedule_json = solarnet_schedule.tojsondict()
+        del schedule_json[SolarnetChargeSchedule.KEY_WEEKDAYS]
+        key = json.dumps(schedule_json, sort_keys=True)
+        merged_schedule = merged_schedules.get(key)
+        if merged_schedule is None:
+            merged_schedules[key] = solarnet_schedule
+        else:
+            merged_schedule.set_weekday_indexes(
+                merged_schedule.get_weekday_indexes()
+                | solarnet_schedule.get_weekday_indexes()
+            )
+    return list(merged_schedules.values())
+
+
+def _same_schedules(
+    schedules: list[SolarnetChargeSchedule], other: list[SolarnetChargeSchedule]
+) -> bool:
+    """Return True if the lists have the same entries, in any order"""
+    if len(schedules) != len(other):
+        return False
+    return sorted(map(_schedule_key, schedules)) == sorted(map(_schedule_key, other))
+
+
+def _schedule_key(solarnet_schedule: SolarnetChargeSchedule) -> str:
+    return json.dumps(solarnet_schedule.tojsondict(), sort_keys=True)
@@ -4,6 +4,7 @@ import logging
 
 from datetime import datetime, time, timedelta
 import json
+from typing import Iterable
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -50,23 +51,31 @@ class SolarnetChargeSchedule:
     _power: int = None
     _schdule_type: str = None
     _time_table: dict[str, time] = None
-    _weekday: int = None
+    _weekdays: set[int] = None
 
-    def __init__(self, hour_to_schedule: datetime = None, power: int = None):
+    def __init__(
+        self,
+        hour_to_schedule: datetime = None,
+        power: int = None,
+        duration: timedelta = timedelta(hours=1),
+    ):
         """The fronius solarnet API only takes the time of day as start and end, not the date.
-        If using the input hour and power, a schedule with one hour interval is created"""
+        If using the input hour and power, a schedule with an interval of the given
+        duration is created, one hour if not set"""
         self._active = True
         self._time_table = {}
+        self._weekdays = set()
 
         if hour_to_schedule is not None:
             start_time = hour_to_schedule.time()
-            if start_time.hour == 23:
+            end = hour_to_schedule + duration
+            if end.date() != hour_to_schedule.date():
                 # The SolarNet interface does not handle date in start and end time.
                 # End time cannot be e.g. 00:00 since start must be earlier than end.
                 # If end should be 00:00 (the next day) it must be set to 23:59 (the same day)
-                end_time = start_time.replace(hour=start_time.hour, minute=59)
+                end_time = time(hour=23, minute=59)
             else:
-                end_time = start_time.replace(hour=(start_time.hour + 1), minute=0)
+                end_time = end.time()
             self.set_start(start_time)
             self.set_end(end_time)
             self.set_weekday_index(hour_to_schedule.weekday())
@@ -111,6 +120,10 @@ class SolarnetChargeSchedule:
         self._power = power
         return self
 
+    def get_schedule_type(self) -> str:
+        """Get schedule type"""
+        return self._schdule_type
+
     def set_schedule_type(self, schedule_type: str):
         """Set schedule type"""
         if not schedule_type in (
@@ -125,16 +138,41 @@ class SolarnetChargeSchedule:
         return self
 
     def get_hour(self) -> datetime:
-        """Return the start hour as an integer"""
+        """Return the start of the schedule as a datetime, on the first weekday if
+        the schedule is active on several days"""
+        return self._start_on(self.get_weekday_index())
+
+    def get_hours(self, slot_minutes: int = 60) -> list[datetime]:
+        """Return the start of each slot of the given length within the time table,
+        on all weekdays of the schedule, where an end time of 23:59 means the end
+        of the day"""
+        end_time = self._time_table[self.KEY_TIME_TABLE_END]
+        hours = []
+        for weekday_index in sorted(self._weekdays):
+            start = self._start_on(weekday_index)
+            end = datetime.combine(start.date(), end_time)
+            if end_time == time(hour=23, minute=59):
+                end = datetime.combine(start.date() + timedelta(days=1), time(0))
+            hour = start
+            while hour < end:
+                hours.append(hour)
+                hour += timedelta(minutes=slot_minutes)
+        return hours
+
+    def _start_on(self, weekday_index: int) -> datetime:
+        """Start of the schedule on the weekday of the current week (Monday to
+        Sunday), except that Monday is tomorrow on a Sunday and Sunday is yesterday
+        on a Monday"""
         now = datetime.now()
         today_weekday = now.weekday()
-        day_delta = self._weekday - today_weekday
+        day_delta = weekday_index - today_weekday
         if day_delta == -6:
             day_delta = 1
         if day_delta == 6:
             day_delta = -1
         schedule_date = (now + timedelta(days=day_delta)).date()
-        schedule_time = time(self._time_table[self.KEY_TIME_TABLE_START].hour)
+        start = self._time_table[self.KEY_TIME_TABLE_START]
+        schedule_time = time(start.hour, start.minute)
         return datetime.combine(schedule_date, schedule_time)
 
     def set_start(self, start: time):
@@ -148,12 +186,22 @@ class SolarnetChargeSchedule:
         return self
 
     def get_weekday_index(self) -> int:
-        """Get day index for the active weekday"""
-        return self._weekday
+        """Get day index for the active weekday, the first one if the schedule is
+        active on several days"""
+        return min(self._weekdays, default=None)
 
     def set_weekday_index(self, weekday_index: int):
         """Set the active weekday index for this schedule"""
-        self._weekday = weekday_index
+        self._weekdays = {weekday_index}
+        return self
+
+    def get_weekday_indexes(self) -> set[int]:
+        """Get day index for all active weekdays"""
+        return set(self._weekdays)
+
+    def set_weekday_indexes(self, weekday_indexes: Iterable[int]):
+        """Set the active weekday indexes, for a schedule repeated on several days"""
+        self._weekdays = set(weekday_indexes)
         return self
 
     def set_weekday_name(self, weekday_name: str):
@@ -162,7 +210,6 @@ class SolarnetChargeSchedule:
             list(self.WEEK_DAYS.values()).index(weekday_name)
         ]
         self.set_weekday_index(weekday_index)
-        self._weekday = weekday_index
 
     def tojsondict(self) -> dict[str:object]:
         """Exports the data in the json format used by solarnet API"""
@@ -180,7 +227,7 @@ class SolarnetChargeSchedule:
         schedule[self.KEY_TIME_TABLE] = time_table
         weekdays = {}
         for weekday_index, weekday_name in self.WEEK_DAYS.items():
-            weekdays[weekday_name] = weekday_index == self._weekday
+            weekdays[weekday_name] = weekday_index in self._weekdays
         schedule[self.KEY_WEEKDAYS] = weekdays
         return schedule
 
@@ -208,9 +255,11 @@ class SolarnetChargeSchedule:
                     ).time()
                 )
             elif key == SolarnetChargeSchedule.KEY_WEEKDAYS:
-                for weekday_name, weekday_active in value.items():
-                    if weekday_active and (
-                        weekday_name in SolarnetChargeSchedule.WEEK_DAYS.values()
-                    ):
-                        schedule.set_weekday_name(weekday_name)
+                schedule.set_weekday_indexes(
+                    weekday_index
+                    for weekday_index, weekday_name in (
+                        SolarnetChargeSchedule.WEEK_DAYS.items()
+                    )
+                    if value.get(weekday_name)
+                )
         return schedule
@@ -125,6 +125,10 @@ class Battery:
         """Minimum allowed energy level based on capacity and minimum SoC limit (Wh)"""
         return int(self._capacity * self._lower_soc_limit)
 
+    def max_energy_limit(self) -> int:
+        """Maximum allowed energy level based on capacity and maximum SoC limit (Wh)"""
+        return int(self._capacity * self._upper_soc_limit)
+
     def is_full(self) -> bool:
         """Return True if the battery is fully charged"""
         return self._energy_watthours >= self._capacity * self._upper_soc_limit
@@ -145,30 +149,39 @@ class Battery:
         return self.charge(self._max_charge_power, charge_hour)
 
     def charge(self, max_charge_power: int, charge_hour: ChargeHour) -> int:
-        """Increase stored energy of the fictive battery
+        """Increase stored energy of the fictive battery for the duration of the
+        charge hour
 
         Return the power level to charge the battery"""
+        hours = charge_hour.get_duration_hours()
         charge_power = min(
-            self.remaining_energy_below_upper_soc_limit(), max_charge_power
+            int(self.remaining_energy_below_upper_soc_limit() / hours),
+            max_charge_power,
         )
-        self.update_average_charge_cost(charge_power, charge_hour.get_import_price())
-        self._energy_watthours += charge_power
+        energy = int(charge_power * hours)
+        self.update_average_charge_cost(energy, charge_hour.get_import_price())
+        self._energy_watthours += energy
         return int(-charge_power)
 
-    def discharge_max_power_for_one_hour(self) -> int:
+    def discharge_max_power_for_one_hour(self, hours: float = 1.0) -> int:
         """Use max allowed discharge level
 
+        hours - Duration of the discharge, shorter than 1 for e.g. 15 minute slots
+
         Return the power level to discharge the battery"""
-        return self.discharge(self._max_discharge_power)
+        return self.discharge(self._max_discharge_power, hours)
 
-    def discharge(self, max_discharge_power: int) -> int:
+    def discharge(self, max_discharge_power: int, hours: float = 1.0) -> int:
         """Decrease stored energy of the fictive battery
 
+        hours - Duration of the discharge, shorter than 1 for e.g. 15 minute slots
+
         Return the power level to discharge the battery"""
         discharge_power = min(
-            self.remaining_energy_above_lower_soc_limit(), max_discharge_power
+            int(self.remaining_energy_above_lower_soc_limit() / hours),
+            max_discharge_power,
         )
-        self._energy_watthours -= discharge_power
+        self._energy_watthours -= int(discharge_power * hours)
         return int(discharge_power)
 
     def remaining_energy_below_upper_soc_limit(self) -> int:
@@ -183,9 +196,9 @@ class Battery:
             0, int(self._energy_watthours - (self._capacity * self._lower_soc_limit))
         )
 
-    def calculate_new_average_charge_cost(self, power: int, price: float) -> float:
+    def calculate_new_average_charge_cost(self, energy: int, price: float) -> float:
         """Calculate new average charge cost for the energy stored in the battery"""
-        new_energy_watthours = power
+        new_energy_watthours = energy
         new_charge_cost = new_energy_watthours * price
         previous_charge_cost = (
             self._average_charge_cost_per_kwh * self._energy_watthours
@@ -197,10 +210,10 @@ class Battery:
         )
         return new_average_charge_cost
 
-    def update_average_charge_cost(self, power: int, price: float) -> None:
-        """Update the average charge cost with the new hour"""
+    def update_average_charge_cost(self, energy: int, price: float) -> None:
+        """Update the average charge cost with the energy (Wh) charged in the new hour"""
         self._average_charge_cost_per_kwh = self.calculate_new_average_charge_cost(
-            power, price
+            energy, price
         )
 
     def needed_hours_to_deplete(self) -> int:
@@ -8,6 +8,8 @@ from .charge_plan import ChargePlan
 class BatteryApiInterface(ABC):
     """Abstract class that defines the interface for a battery scheduler"""
 
+    _slot_minutes: int = 60
+
     @classmethod
     @abstractmethod
     def __init__(cls, secrets_json: dict[str, str], hass: HomeAssistant):
@@ -35,3 +37,15 @@ class BatteryApiInterface(ABC):
     async def clear(cls) -> bool:
         """Clear the battery schedule
         Return True if successful"""
+
+    def set_slot_minutes(self, slot_minutes: int) -> None:
+        """Set the length (minutes) of each hour of the charge plans, to read back
+        the active charge plan with the same slots as it was scheduled with"""
+        self._slot_minutes = slot_minutes
+
+    def get_statistics(self) -> dict[str, int]:
+        """Get statistics of the requests to the battery, empty if not tracked"""
+        return {}
+
+    async def close(self) -> None:
+        """Release the connections to the battery, if any are kept open"""
@@ -1,25 +1,47 @@
 """Battery Planner main class"""
 
+import asyncio
 import logging
 import json
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, time
+from functools import partial
+from time import monotonic
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant
 from homeassistant.helpers.dispatcher import async_dispatcher_send
-
-from .const import EVENT_NEW_DATA
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    EVENT_NEW_DATA,
+    PLANNER_GREEDY,
+    PLANNER_OPTIMAL,
+    PLANNER_TRADE,
+    VERIFY_DELAY,
+)
 from .charge_plan import ChargePlan
 from .charge_hour import ChargeHour
-from .planner import Planner, create_empty_plan
+from .planner import Planner, PlanningCancelled, create_empty_plan
+from .optimal_planner import OptimalPlanner
+from .anytime_planner import AnytimePlanner
+from .trade_planner import TradePlanner
 from .battery import Battery
 from .battery_api_interface import BatteryApiInterface
+from .plan_cache import PlanCache
+from .time_base import TimeBase
 
 _LOGGER = logging.getLogger(__name__)
 
 API_PATH = "custom_components.battery_planner.api"
 SECRETS_PATH = "secrets.json"
 
+PLANNER_ENGINES: dict[str, type[Planner]] = {
+    PLANNER_GREEDY: Planner,
+    PLANNER_OPTIMAL: OptimalPlanner,
+    PLANNER_TRADE: TradePlanner,
+}
+
 
 class BatteryPlanner:
     """Main class to handle data and push updates"""
@@ -30,21 +52,169 @@ class BatteryPlanner:
     _active_charge_plan: ChargePlan
     _battery: Battery
     _battery_api: BatteryApiInterface
+    _slot_minutes: int
+    _max_daily_cycles: int
+    _plan_cache: PlanCache
+    # The last created plan and the settings of the planner that created it
+    _last_charge_plan: tuple[tuple, ChargePlan] | None
+    _incremental_statistics: dict[str, int]
+    # Sum of the statistics of all planners that have created plans
+    _planner_statistics: dict[str, int]
+    # Plans are created in a worker thread, to not block the event loop
+    _planning_executor: ThreadPoolExecutor
+    # Increased for every request that replaces the plan being created
+    _planning_generation: int
+    _planning_statistics: dict[str, int]
+    # (s) Reschedule requests within this time are merged into one, 0 disables it
+    _reschedule_window: float
+    # Arguments of the latest reschedule request waiting for the window to end
+    _pending_reschedule: tuple[tuple, dict] | None
+    _cancel_reschedule_timer: CALLBACK_TYPE | None
+    _reschedule_statistics: dict[str, int]
+    # The last plan pushed to or fetched from the battery, None if not known
+    _reference_charge_plan: ChargePlan | None
+    # A changed plan is not pushed unless its yield is this much higher
+    _min_yield_improvement: float
+    _push_statistics: dict[str, int]
+    # The fetch of the active charge plan in progress, shared by all refreshes
+    _active_plan_fetch: asyncio.Task | None
+    # (s) A fetched active charge plan is reused by refreshes within this time
+    _active_plan_ttl: float
+    _active_plan_expiry: float
+    _active_plan_statistics: dict[str, int]
+    # The active charge plan expected after the last push, until it is read back
+    _expected_charge_plan: ChargePlan | None
+    _cancel_verification_timer: CALLBACK_TYPE | None
 
     def __init__(
         self,
         hass: HomeAssistant,
         battery: Battery,
+        slot_minutes: int = 60,
+        plan_cache: PlanCache | None = None,
+        max_daily_cycles: int = 2,
+        reschedule_window: float = 0,
+        min_yield_improvement: float = 0,
+        active_plan_ttl: float = 5,
     ):
         self._hass = hass
         self._active_charge_plan = None  # type: ignore
         self._battery = battery
         self._latest_prices = {}
+        self._slot_minutes = slot_minutes
+        self._max_daily_cycles = max_daily_cycles
+        self._plan_cache = plan_cache if plan_cache is not None else PlanCache()
+        self._last_charge_plan = None
+        self._incremental_statistics = {"repaired": 0, "replanned": 0}
+        self._planner_statistics = {}
+        self._planning_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="battery_planner"
+        )
+        self._planning_generation = 0
+        self._planning_statistics = {"cancelled": 0, "superseded": 0}
+        self._reschedule_window = reschedule_window
+        self._pending_reschedule = None
+        self._cancel_reschedule_timer = None
+        self._reschedule_statistics = {"requests": 0, "merged": 0}
+        self._reference_charge_plan = None
+        self._min_yield_improvement = min_yield_improvement
+        self._push_statistics = {
+            "pushed": 0,
+            "skipped_unchanged": 0,
+            "skipped_small_improvement": 0,
+        }
+        self._active_plan_fetch = None
+        self._active_plan_ttl = active_plan_ttl
+        self._active_plan_expiry = 0.0
+        self._active_plan_statistics = {
+            "fetched": 0,
+            "joined": 0,
+            "cached": 0,
+            "verified": 0,
+            "mismatched": 0,
+            "unverified": 0,
+        }
+        self._expected_charge_plan = None
+        self._cancel_verification_timer = None
         self._battery_api = create_api_instance_from_secrets_file(hass)
+        self._battery_api.set_slot_minutes(slot_minutes)
+
+    def get_slot_minutes(self) -> int:
+        """Get the length (minutes) of each price and schedule slot"""
+        return self._slot_minutes
+
+    def get_statistics(self) -> dict[str, dict[str, int]]:
+        """Get statistics of the planning, to follow up on performance"""
+        return {
+            "plan_cache": self._plan_cache.get_statistics(),
+            "incremental": dict(self._incremental_statistics),
+            "planner": dict(self._planner_statistics),
+            "planning": dict(self._planning_statistics),
+            "reschedule": dict(self._reschedule_statistics),
+            "push": dict(self._push_statistics),
+            "active_plan": dict(self._active_plan_statistics),
+            "battery_api": self._battery_api.get_statistics(),
+        }
+
+    async def shutdown(self) -> None:
+        """Cancel the planning in progress, stop the planning worker thread and
+        close the connections to the battery"""
+        self._cancel_pending_reschedule()
+        self._cancel_pending_verification()
+        self._cancel_planning()
+        self._planning_executor.shutdown(wait=False, cancel_futures=True)
+        await self._battery_api.close()
+
+    def _cancel_planning(self) -> int:
+        """Make the plan being created, if any, outdated and return the generation
+        of the next plan"""
+        self._planning_generation += 1
+        return self._planning_generation
+
+    def _is_outdated(self, generation: int) -> bool:
+        return generation != self._planning_generation
+
+    async def request_reschedule(self, *args, **kwargs) -> None:
+        """Reschedule with the same arguments as reschedule, but merge requests that
+        are made within the reschedule window into one
+
+        The window starts at the first request, and reschedule is then called once
+        with the arguments of the latest request when it ends"""
+        self._reschedule_statistics["requests"] += 1
+        if self._reschedule_window <= 0:
+            await self.reschedule(*args, **kwargs)
+            return
+        if self._pending_reschedule is not None:
+            self._reschedule_statistics["merged"] += 1
+            _LOGGER.debug("Reschedule request merged with the pending request")
+        self._pending_reschedule = (args, kwargs)
+        if self._cancel_reschedule_timer is None:
+            self._cancel_reschedule_timer = async_call_later(
+                self._hass, self._reschedule_window, self._reschedule_pending
+            )
+
+    async def _reschedule_pending(self, _now: datetime) -> None:
+        self._cancel_reschedule_timer = None
+        if self._pending_reschedule is None:
+            return
+        args, kwargs = self._pending_reschedule
+        self._pending_reschedule = None
+        await self.reschedule(*args, **kwargs)
+
+    def _cancel_pending_reschedule(self) -> None:
+        """Drop the reschedule request waiting for the window to end, if any"""
+        if self._cancel_reschedule_timer is not None:
+            self._cancel_reschedule_timer()
+            self._cancel_reschedule_timer = None
+        self._pending_reschedule = None
 
     async def stop(self) -> None:
         """Stop the battery"""
+        self._cancel_pending_reschedule()
+        self._cancel_planning()
+        self._reference_charge_plan = None
         stop_succeeded = await self._battery_api.stop()
+        self._invalidate_active_charge_plan()
         if stop_succeeded:
             _LOGGER.info("Battery was stopped")
         else:
@@ -53,7 +223,11 @@ class BatteryPlanner:
 
     async def clear(self) -> None:
         """Clear the battery schedule"""
+        self._cancel_pending_reschedule()
+        self._cancel_planning()
+        self._reference_charge_plan = None
         stop_succeeded = await self._battery_api.clear()
+        self._invalidate_active_charge_plan()
         if stop_succeeded:
             _LOGGER.info("Battery schedule was cleared")
         else:
@@ -64,8 +238,12 @@ class BatteryPlanner:
         self, battery_state_of_charge: float, power: int, use_limit: bool
     ) -> None:
         """Charge or discharge the battery with provided power, starting immediately"""
-        current_hour: int = datetime.now().hour
-        charge_plan = create_empty_plan(start_hour=current_hour)
+        self._cancel_pending_reschedule()
+        self._cancel_planning()
+        self._reference_charge_plan = None
+        time_base = TimeBase.today(self._slot_minutes)
+        current_hour: int = time_base.index_of(datetime.now())
+        charge_plan = create_empty_plan(start_hour=current_hour, time_base=time_base)
         shall_discharge: bool = power > 0
 
         battery = Battery(
@@ -83,23 +261,28 @@ class BatteryPlanner:
             else:
                 power = -min(battery.get_max_charge_power(), abs(power))
 
-        charge_plan.add_charge_hour(ChargeHour(current_hour, 0.0, 0.0, power))
+        charge_plan.add_charge_hour(
+            ChargeHour(current_hour, 0.0, 0.0, power, time_base)
+        )
 
         next_hour = current_hour + 1
         if shall_discharge:
             while not battery.is_empty():
-                charge_hour = ChargeHour(next_hour, 0.0, 0.0, power)
-                charge_hour.set_power(battery.discharge(abs(power)))
+                charge_hour = ChargeHour(next_hour, 0.0, 0.0, power, time_base)
+                charge_hour.set_power(
+                    battery.discharge(abs(power), charge_hour.get_duration_hours())
+                )
                 charge_plan.add_charge_hour(charge_hour)
                 next_hour += 1
         else:
             while not battery.is_full():
-                charge_hour = ChargeHour(next_hour, 0.0, 0.0, power)
+                charge_hour = ChargeHour(next_hour, 0.0, 0.0, power, time_base)
                 charge_hour.set_power(battery.charge(abs(power), charge_hour))
                 charge_plan.add_charge_hour(charge_hour)
                 next_hour += 1
 
         charge_succeeded = await self._battery_api.schedule_battery(charge_plan)
+        self._invalidate_active_charge_plan()
         if charge_succeeded:
             _LOGGER.info("Battery started charging/discharging with power %s", power)
         else:
@@ -118,8 +301,23 @@ class BatteryPlanner:
         battery_cycle_cost: float,
         price_margin: float,
         low_price_threshold: float,
+        planner_engine: str = PLANNER_GREEDY,
+        incremental: bool = False,
+        time_budget: float = 0,
     ) -> None:
-        """Get future prices and create new schedule"""
+        """Get future prices and create new schedule
+
+        If incremental is True, the previous plan is repaired for the new start hour
+        and battery state of charge, instead of creating a new plan
+
+        If time_budget (s) is set, a greedy plan is created first and then refined
+        by more expensive planners until the time is up, instead of using the
+        planner engine
+
+        The plan is created in a worker thread. If reschedule is called again, or
+        the battery is stopped, cleared or charged, before the plan is ready, the
+        planning is cancelled and the plan is not scheduled."""
+        generation = self._cancel_planning()
         _LOGGER.info(
             "Rescheduling battery, battery state of charge = %s%%",
             battery_state_of_charge,
@@ -128,13 +326,19 @@ class BatteryPlanner:
         _LOGGER.debug("Export prices = %s", export_prices)
         _LOGGER.debug("Battery cycle cost = %s", battery_cycle_cost)
         _LOGGER.debug("Price margin = %s", price_margin)
+        _LOGGER.debug("Planner engine = %s", planner_engine)
+        _LOGGER.debug("Time budget = %s s", time_budget)
         self._latest_prices["import"] = import_prices
         self._latest_prices["export"] = export_prices
 
-        planner: Planner = Planner(
+        planner: Planner = create_planner(
+            planner_engine,
             battery_cycle_cost,
             price_margin,
             low_price_threshold,
+            self._slot_minutes,
+            self._max_daily_cycles,
+            time_budget,
         )
 
         battery = Battery(
@@ -146,37 +350,256 @@ class BatteryPlanner:
         )
         battery.set_soc(battery_state_of_charge)
 
-        next_hour = (datetime.now() + timedelta(hours=1)).hour
-        if next_hour == 0:
-            next_hour = 24
+        # The slot after the current one, counted from midnight today
+        time_base = TimeBase.today(self._slot_minutes)
+        next_hour = time_base.index_of(datetime.now()) + 1
 
-        charge_plan = planner.create_price_arbitrage_plan(
+        self._plan_cache.set_start(time_base.get_epoch(), next_hour)
+        cache_key = self._plan_cache.create_key(
             battery,
+            battery_state_of_charge,
             import_prices,
             export_prices,
-            next_hour,
+            planner.get_settings(),
+            incremental,
         )
+        charge_plan = self._plan_cache.get(cache_key)
+        if charge_plan is None:
+            planner.set_cancel_check(lambda: self._is_outdated(generation))
+            try:
+                charge_plan = await self._hass.loop.run_in_executor(
+                    self._planning_executor,
+                    self._create_charge_plan,
+                    planner,
+                    battery,
+                    import_prices,
+                    export_prices,
+                    next_hour,
+                    incremental,
+                )
+            except PlanningCancelled:
+                _LOGGER.info("Planning was cancelled by a newer request")
+                self._planning_statistics["cancelled"] += 1
+                return
+            self._plan_cache.put(cache_key, charge_plan)
+            for key, value in planner.get_statistics().items():
+                self._planner_statistics[key] = (
+                    self._planner_statistics.get(key, 0) + value
+                )
+            _LOGGER.debug("Planner statistics = %s", self._planner_statistics)
+        else:
+            _LOGGER.debug("Reusing cached charge plan")
+        if self._is_outdated(generation):
+            # The plan was finished before the planning could be cancelled
+            _LOGGER.info("Charge plan was replaced by a newer request")
+            self._planning_statistics["superseded"] += 1
+            return
+        self._last_charge_plan = (planner.get_settings(), charge_plan)
+
+        if not self._shall_push(charge_plan):
+            return
 
         _LOGGER.debug("New charge plan will be scheduled:\n%s", charge_plan)
 
         schedule_succeeded = await self._battery_api.schedule_battery(charge_plan)
+        self._invalidate_active_charge_plan()
         if schedule_succeeded:
             _LOGGER.info("Battery was scheduled with a new charge plan")
+            self._push_statistics["pushed"] += 1
+            self._reference_charge_plan = charge_plan
+            self._set_expected_charge_plan(charge_plan)
         else:
             _LOGGER.error("Failed to schedule battery with new charge plan")
-        await self.get_active_charge_plan(refresh=True)
+            self._reference_charge_plan = None
+            await self.get_active_charge_plan(refresh=True)
+
+    def _shall_push(self, charge_plan: ChargePlan) -> bool:
+        """Return False if the battery already runs the same power schedule for the
+        hours of the plan, or a schedule with almost the same yield
+
+        An hour of the plan that the battery has no schedule for is a change, also
+        with 0 W, since a 0 W hour holds the battery and a missing hour does not"""
+        reference_plan = self._reference_charge_plan
+        if reference_plan is None or charge_plan.len() == 0:
+            return True
+        if not all(
+            reference_plan.is_scheduled(charge_hour.get_time())
+            for charge_hour in charge_plan.get_hours_list()
+        ):
+            return True
+        start = charge_plan.get_first().get_time()
+        end = charge_plan.get_last().get_time() + timedelta(
+            hours=charge_plan.get_last().get_duration_hours()
+        )
+        if charge_plan.power_fingerprint(start, end) == (
+            reference_plan.power_fingerprint(start, end)
+        ):
+            _LOGGER.info("Battery already runs the new charge plan, not pushing it")
+            self._push_statistics["skipped_unchanged"] += 1
+            return False
+        if self._min_yield_improvement > 0:
+            improvement = charge_plan.expected_yield() - _yield_with_powers_of(
+                charge_plan, reference_plan
+            )
+            if improvement < self._min_yield_improvement:
+                _LOGGER.info(
+                    "New charge plan improves the yield by %.2f only, not pushing it",
+                    improvement,
+                )
+                self._push_statistics["skipped_small_improvement"] += 1
+                return False
+        return True
+
+    def _create_charge_plan(
+        self,
+        planner: Planner,
+        battery: Battery,
+        import_prices: list[float],
+        export_prices: list[float],
+        start_hour: int,
+        incremental: bool,
+    ) -> ChargePlan:
+        """Create or repair a plan, called in the planning worker thread"""
+        if incremental and self._last_charge_plan is not None:
+            planner_settings, previous_plan = self._last_charge_plan
+            if planner_settings == planner.get_settings():
+                charge_plan = planner.repair_plan(
+                    previous_plan,
+                    battery.clone(),
+                    import_prices,
+                    export_prices,
+                    start_hour,
+                )
+                if charge_plan is not None:
+                    _LOGGER.debug("Repaired the previous charge plan")
+                    self._incremental_statistics["repaired"] += 1
+                    return charge_plan
+            _LOGGER.debug("Previous charge plan could not be repaired, replanning")
+            self._incremental_statistics["replanned"] += 1
+        return planner.create_price_arbitrage_plan(
+            battery,
+            import_prices,
+            export_prices,
+            start_hour,
+        )
 
     async def get_active_charge_plan(self, refresh: bool = False) -> ChargePlan:
-        """Get the currently active schedule from API"""
+        """Get the currently active schedule from API
+
+        Concurrent refreshes wait for the same fetch, and a plan fetched within the
+        active plan TTL is reused unless the battery has been scheduled since"""
         if self._active_charge_plan is None or refresh is True:
-            active_charge_plan = await self._get_active_charge_plan()
-            if isinstance(active_charge_plan, ChargePlan):
-                self._active_charge_plan = active_charge_plan
-                async_dispatcher_send(self._hass, EVENT_NEW_DATA)
+            if self._active_charge_plan is not None and (
+                monotonic() < self._active_plan_expiry
+            ):
+                self._active_plan_statistics["cached"] += 1
+                return self._active_charge_plan
+            fetch = self._active_plan_fetch
+            if fetch is None:
+                fetch = self._hass.async_create_task(self._update_active_charge_plan())
+                self._active_plan_fetch = fetch
             else:
-                _LOGGER.error("Could not fetch the active charge plan from the battery")
+                self._active_plan_statistics["joined"] += 1
+            # The fetch is shared, it shall not be cancelled with this caller
+            await asyncio.shield(fetch)
         return self._active_charge_plan
 
+    async def _update_active_charge_plan(self) -> None:
+        fetch = asyncio.current_task()
+        try:
+            active_charge_plan = await self._get_active_charge_plan()
+        finally:
+            outdated = self._active_plan_fetch is not fetch
+            if not outdated:
+                self._active_plan_fetch = None
+        self._active_plan_statistics["fetched"] += 1
+        if outdated:
+            _LOGGER.debug("Battery was scheduled during the fetch, plan dropped")
+            return
+        if isinstance(active_charge_plan, ChargePlan):
+            self._active_charge_plan = active_charge_plan
+            self._reference_charge_plan = active_charge_plan
+            self._active_plan_expiry = monotonic() + self._active_plan_ttl
+            async_dispatcher_send(self._hass, EVENT_NEW_DATA)
+        else:
+            _LOGGER.error("Could not fetch the active charge plan from the battery")
+
+    def _invalidate_active_charge_plan(self) -> None:
+        """The battery has been scheduled, the fetched active charge plan and a
+        fetch in progress are outdated"""
+        self._active_plan_fetch = None
+        self._active_plan_expiry = 0.0
+        self._expected_charge_plan = None
+        self._cancel_pending_verification()
+
+    def _set_expected_charge_plan(self, charge_plan: ChargePlan) -> None:
+        """Show the plan that was pushed as the active charge plan at once, and read
+        back the active charge plan from the battery when the verify delay has passed
+
+        The battery keeps the hours of today that the pushed plan does not have, so
+        they are kept from the active charge plan"""
+        time_base = TimeBase.today(self._slot_minutes)
+        expected_charge_plan = ChargePlan(time_base)
+        if self._active_charge_plan is not None:
+            for charge_hour in self._active_charge_plan.get_hours_list():
+                if charge_hour.get_time().date() == time_base.get_epoch().date():
+                    expected_charge_plan.add_charge_hour(charge_hour)
+        for charge_hour in charge_plan.get_hours_list():
+            expected_charge_plan.add_charge_hour(charge_hour)
+        self._active_charge_plan = expected_charge_plan
+        self._expected_charge_plan = expected_charge_plan
+        async_dispatcher_send(self._hass, EVENT_NEW_DATA)
+        self._cancel_pending_verification()
+        self._cancel_verification_timer = async_call_later(
+            self._hass,
+            VERIFY_DELAY,
+            partial(self._verify_active_charge_plan, expected_charge_plan, charge_plan),
+        )
+
+    async def _verify_active_charge_plan(
+        self,
+        expected_charge_plan: ChargePlan,
+        charge_plan: ChargePlan,
+        _now: datetime,
+    ) -> None:
+        """Replace the expected active charge plan with the one read back from the
+        battery, and log if the pushed hours differ or could not be read back"""
+        self._cancel_verification_timer = None
+        try:
+            active_charge_plan = await self.get_active_charge_plan(refresh=True)
+        except Exception as error:  # pylint: disable=broad-except
+            # Nothing awaits the timer that runs this, so the error is handled here
+            _LOGGER.debug("Reading back the active charge plan failed: %s", error)
+            active_charge_plan = expected_charge_plan
+        if self._expected_charge_plan is not expected_charge_plan:
+            # The battery has been scheduled again since
+            return
+        self._expected_charge_plan = None
+        if active_charge_plan is expected_charge_plan:
+            # The expected plan is kept when the fetch fails
+            _LOGGER.warning("Could not read back the charge plan pushed to the battery")
+            self._active_plan_statistics["unverified"] += 1
+            return
+        if charge_plan.len() == 0:
+            return
+        start = charge_plan.get_first().get_time()
+        end = charge_plan.get_last().get_time() + timedelta(
+            hours=charge_plan.get_last().get_duration_hours()
+        )
+        if active_charge_plan.power_fingerprint(start, end) == (
+            charge_plan.power_fingerprint(start, end)
+        ):
+            self._active_plan_statistics["verified"] += 1
+        else:
+            _LOGGER.warning("The battery does not run the charge plan that was pushed")
+            self._active_plan_statistics["mismatched"] += 1
+
+    def _cancel_pending_verification(self) -> None:
+        """Drop the read back of the pushed plan that waits for the delay, if any"""
+        if self._cancel_verification_timer is not None:
+            self._cancel_verification_timer()
+            self._cancel_verification_timer = None
+
     async def _get_active_charge_plan(self) -> ChargePlan:
         active_charge_plan = await self._battery_api.get_active_charge_plan()
         for hour in active_charge_plan.get_hours_list():
@@ -201,6 +624,69 @@ def map_prices_to_hour(
     return hourly_prices
 
 
+def _yield_with_powers_of(charge_plan: ChargePlan, reference_plan: ChargePlan) -> float:
+    """Expected yield of the hours and prices of charge_plan, if the power of
+    reference_plan is used instead"""
+    charge_plan_with_reference_power = ChargePlan(charge_plan.get_time_base())
+    for charge_hour in charge_plan.get_hours_list():
+        power = 0
+        if reference_plan.is_scheduled(charge_hour.get_time()):
+            power = reference_plan.get_power(charge_hour.get_time())
+        charge_plan_with_reference_power.add_charge_hour(
+            ChargeHour(
+                charge_hour.get_index(),
+                charge_hour.get_import_price(),
+                charge_hour.get_export_price(),
+                power,
+                charge_hour.get_time_base(),
+            )
+        )
+    return charge_plan_with_reference_power.expected_yield()
+
+
+def create_planner(
+    planner_engine: str,
+    battery_cycle_cost: float,
+    price_margin: float,
+    low_price_threshold: float,
+    slot_minutes: int = 60,
+    max_daily_cycles: int = 2,
+    time_budget: float = 0,
+) -> Planner:
+    """Create a planner instance of the requested planner engine
+
+    max_daily_cycles is only used by the trade planner. If time_budget (s) is set,
+    an anytime planner is created regardless of the planner engine"""
+    if time_budget > 0:
+        return AnytimePlanner(
+            battery_cycle_cost,
+            price_margin,
+            low_price_threshold,
+            time_budget=time_budget,
+            max_daily_cycles=max_daily_cycles,
+            slot_minutes=slot_minutes,
+        )
+    if planner_engine not in PLANNER_ENGINES:
+        raise ValueError(
+            f'Planner engine "{planner_engine}" not supported, '
+            f"use one of {list(PLANNER_ENGINES)}"
+        )
+    if planner_engine == PLANNER_TRADE:
+        return TradePlanner(
+            battery_cycle_cost,
+            price_margin,
+            low_price_threshold,
+            max_daily_cycles=max_daily_cycles,
+            slot_minutes=slot_minutes,
+        )
+    return PLANNER_ENGINES[planner_engine](
+        battery_cycle_cost,
+        price_margin,
+        low_price_threshold,
+        slot_minutes=slot_minutes,
+    )
+
+
 def create_api_instance_from_secrets_file(hass: HomeAssistant):
     """Create battery api instance from the api privided in secrets file"""
     secrets_json = get_secrets()
@@ -1,38 +1,77 @@
 """Object holding price and charge data for one hour"""
 
 import logging
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from .time_base import TimeBase
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class ChargeHour:
-    """Data class to hold charge level and import and export prices for an hour"""
+    """Data class to hold charge level and import and export prices for an hour
+
+    The hour is stored as an index counted from the epoch of a TimeBase, the datetime
+    and ISO string of the hour are created when first needed and then cached.
+    The hour lasts for one slot of the TimeBase, which is shorter than an hour when
+    the prices are e.g. per 15 minutes"""
+
+    __slots__ = (
+        "_hour",
+        "_time_base",
+        "_import_price",
+        "_export_price",
+        "_power_watts",
+        "_listener",
+        "_hour_dt",
+        "_hour_iso",
+    )
 
     _hour: int
-    _hour_dt: datetime
+    _time_base: TimeBase
     _import_price: float
     _export_price: float
     _power_watts: int
-
-    def __init__(self, hour: int, import_price: float, export_price: float, power: int):
+    _listener: Callable[["ChargeHour", float], None] | None
+    _hour_dt: datetime | None
+    _hour_iso: str | None
+
+    def __init__(
+        self,
+        hour: int,
+        import_price: float,
+        export_price: float,
+        power: int,
+        time_base: TimeBase | None = None,
+    ):
+        self._time_base = time_base if time_base is not None else TimeBase.today()
         self.set_hour(hour)
         self._import_price = round(import_price, 2)
         self._export_price = round(export_price, 2)
         self._power_watts = power
+        self._listener = None
 
     @classmethod
     def from_dt(
-        cls, hour_dt: datetime, import_price: float, export_price: float, power: int
+        cls,
+        hour_dt: datetime,
+        import_price: float,
+        export_price: float,
+        power: int,
+        time_base: TimeBase | None = None,
     ):
         """Create a ChargeHour object where the hour is represented by a datetime object"""
-        tomorrow = (datetime.now() + timedelta(days=1)).day
+        if time_base is None:
+            time_base = TimeBase.today()
+        tomorrow = (time_base.get_epoch() + timedelta(days=1)).day
+        slots_per_day = time_base.slots_per_day()
         hour_index = 0
         if hour_dt.day == tomorrow:
-            hour_index = 24
-        hour_index += hour_dt.hour
+            hour_index = slots_per_day
+        hour_index += time_base.index_of(hour_dt) % slots_per_day
 
-        return ChargeHour(hour_index, import_price, export_price, power)
+        return ChargeHour(hour_index, import_price, export_price, power, time_base)
 
     def __repr__(self):
         return self.__str__()
@@ -56,41 +95,71 @@ class ChargeHour:
             "power": self._power_watts,
         }
 
-    def clone(self):
-        """Create a clone of this object"""
+    def clone(self, time_base: TimeBase | None = None):
+        """Create a clone of this object, with the index counted from time_base if set"""
+        hour = self.get_index()
+        if time_base is None:
+            time_base = self._time_base
+        elif time_base is not self._time_base:
+            hour = time_base.index_of(self.get_time())
         return ChargeHour(
-            hour=self.get_index(),
+            hour=hour,
             import_price=self.get_import_price(),
             export_price=self.get_export_price(),
             power=self.get_power(),
+            time_base=time_base,
         )
 
+    def set_listener(
+        self, listener: Callable[["ChargeHour", float], None] | None
+    ) -> None:
+        """Set a callback to be notified when the power or a price is changed
+        The callback gets this hour and the yield of the hour before the change"""
+        self._listener = listener
+
+    def _notify(self, previous_yield: float) -> None:
+        if self._listener is not None:
+            self._listener(self, previous_yield)
+
     def set_hour(self, hour: int):
-        """Set hour from an int where 0 equals midnight today, save as a datetime object"""
+        """Set hour from an int where 0 equals midnight of the time base epoch"""
         self._hour = hour
-        now = datetime.now()
-        today_midnight = datetime.combine(now.date(), time(0))
-        self._hour_dt = today_midnight + timedelta(hours=hour)
+        self._hour_dt = None
+        self._hour_iso = None
 
     def get_index(self) -> int:
-        """Get the hour as index (0 = today midnight)"""
+        """Get the hour as index (0 = midnight of the time base epoch)"""
         return self._hour
 
+    def get_time_base(self) -> TimeBase:
+        """Get the time base that the index is counted from"""
+        return self._time_base
+
+    def get_duration_hours(self) -> float:
+        """Get the length of the hour, which is the slot length of the time base"""
+        return self._time_base.get_slot_hours()
+
     def get_time(self) -> datetime:
         """Get the hour as datetime"""
+        if self._hour_dt is None:
+            self._hour_dt = self._time_base.time_of(self._hour)
         return self._hour_dt
 
     def hour_iso_string(self) -> str:
         """Get string representation of the hour as ISO format"""
-        return datetime.combine(
-            self._hour_dt.date(), time(hour=self._hour_dt.hour)
-        ).isoformat()
+        if self._hour_iso is None:
+            self._hour_iso = self.get_time().isoformat()
+        return self._hour_iso
 
     def set_power(self, power_watts: int) -> None:
         """Set the power level for the hour, will be 0 if not set
         power_watts - (W) Negative value = charge (consuming), positive = discharge (producing)
         """
+        if power_watts == self._power_watts:
+            return
+        previous_yield = self.get_yield()
         self._power_watts = power_watts
+        self._notify(previous_yield)
 
     def get_power(self) -> int:
         """Get the power level for the hour, will be 0 if not previously set
@@ -104,7 +173,9 @@ class ChargeHour:
 
     def set_import_price(self, price: float):
         """Set the electricity import price for this hour"""
+        previous_yield = self.get_yield()
         self._import_price = price
+        self._notify(previous_yield)
 
     def get_import_price(self) -> float:
         """Get the electricity import price for this hour"""
@@ -112,7 +183,9 @@ class ChargeHour:
 
     def set_export_price(self, price: float):
         """Set the electricity export price for this hour"""
+        previous_yield = self.get_yield()
         self._export_price = price
+        self._notify(previous_yield)
 
     def get_export_price(self) -> float:
         """Get the electricity export price for this hour"""
@@ -125,6 +198,13 @@ class ChargeHour:
         else:
             return self._import_price
 
+    def get_yield(self) -> float:
+        """Get the financial yield of the power set for this hour, 0.0 if the price is unknown"""
+        price = self.get_active_price()
+        if price is None:
+            return 0.0
+        return (self._power_watts / 1000) * self.get_duration_hours() * price
+
     def is_set_to_charge(self) -> bool:
         """Return True if the hour is set to charge (power below 0)"""
         return self._power_watts < 0
@@ -1,10 +1,13 @@
 """Charge Plan"""
 
 import logging
-from datetime import datetime, time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
 from typing import Callable, Any
 
 from .charge_hour import ChargeHour
+from .charge_plan_columns import ChargePlanColumns
+from .time_base import TimeBase
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,9 +18,25 @@ class ChargePlan:
     KEY_POWER = "power"
     KEY_PRICE = "price"
 
-    # The key is an hour represented as datetime in ISO string format
-    # {"2023-08-20T00:00:00": ChargeHour object}
-    _schedule: dict[str, ChargeHour]
+    # The hours of the plan are counted from this time base, hours that are added with
+    # another time base are converted to it
+    _time_base: TimeBase | None
+    # The hours sorted by time, stored contiguously so that they can be accessed
+    # by their position in the plan
+    _hours: list[ChargeHour]
+    # Position in _hours for each hour, the key is the index of the hour counted
+    # from the time base, {24: 0} for a plan starting at midnight tomorrow
+    _positions: dict[int, int]
+    # Prices and power levels of _hours as NumPy arrays, in the same order
+    _columns: ChargePlanColumns
+
+    # Running total of the yield of all hours, kept up to date when power or
+    # prices of the hours change
+    _yield: float
+    # Index of the hours that have changed since the last clear_changed_hours()
+    _changed_hours: set[int]
+    # Energy (Wh) in the battery at the start of the plan, if known
+    _initial_energy: int | None
 
     @classmethod
     def from_hours_list(cls, hours: list[ChargeHour]):
@@ -27,53 +46,140 @@ class ChargePlan:
             plan.add_charge_hour(hour)
         return plan
 
-    def __init__(self):
-        self._schedule = {}
+    def __init__(self, time_base: TimeBase | None = None):
+        self._time_base = time_base
+        self._hours = []
+        self._positions = {}
+        self._columns = ChargePlanColumns(
+            slot_hours=self.get_time_base().get_slot_hours()
+        )
+        self._yield = 0.0
+        self._changed_hours = set()
+        self._initial_energy = None
 
     def __repr__(self):
-        return str(self._schedule)
+        return str(self.get_hours_dict())
 
     def __str__(self):
         readable_entry = []
-        for hour, charge_hour in self._schedule.items():
+        for hour, charge_hour in self.get_hours_dict().items():
             readable_entry.append(f"{hour}: {charge_hour}")
         return str.join("\n", readable_entry)
 
     def add_charge_hour(self, charge_hour: ChargeHour) -> None:
-        """Add a new hour from a ChargeHour object"""
-        self._schedule[hour_iso_string(charge_hour.get_time())] = charge_hour.clone()
-        self._schedule = dict(
-            sorted(self._schedule.items(), key=lambda d: d[1].get_time())
-        )
+        """Add a new hour from a ChargeHour object, replacing any hour at the same time
+
+        Adding hours in time order appends them in O(1)"""
+        if self._time_base is None:
+            self._time_base = charge_hour.get_time_base()
+            self._columns = ChargePlanColumns(
+                slot_hours=self._time_base.get_slot_hours()
+            )
+        new_charge_hour = charge_hour.clone(self._time_base)
+        key = new_charge_hour.get_index()
+        position = self._positions.get(key)
+        if position is not None:
+            self._detach(self._hours[position])
+            self._hours[position] = new_charge_hour
+            self._columns.update(position, new_charge_hour)
+        elif (
+            not self._hours or self._hours[-1].get_index() < new_charge_hour.get_index()
+        ):
+            self._positions[key] = len(self._hours)
+            self._hours.append(new_charge_hour)
+            self._columns.append(new_charge_hour)
+        else:
+            position = bisect_left(
+                self._hours, new_charge_hour.get_index(), key=ChargeHour.get_index
+            )
+            self._hours.insert(position, new_charge_hour)
+            self._columns.insert(position, new_charge_hour)
+            self._update_positions(position)
+        self._yield += new_charge_hour.get_yield()
+        new_charge_hour.set_listener(self._on_hour_changed)
 
     def pop(self, index: int = 0) -> ChargeHour:
         """Remove item from plan based on index value"""
-        return self._schedule.pop(self.get_hours_list()[index].hour_iso_string())
+        if index < 0:
+            index += len(self._hours)
+        charge_hour = self._hours.pop(index)
+        self._columns.remove(index)
+        del self._positions[charge_hour.get_index()]
+        self._update_positions(index)
+        self._detach(charge_hour)
+        return charge_hour
+
+    def _update_positions(self, start: int) -> None:
+        for position in range(start, len(self._hours)):
+            self._positions[self._hours[position].get_index()] = position
+
+    def _detach(self, charge_hour: ChargeHour) -> None:
+        charge_hour.set_listener(None)
+        self._yield -= charge_hour.get_yield()
+
+    def _on_hour_changed(self, charge_hour: ChargeHour, previous_yield: float) -> None:
+        self._yield += charge_hour.get_yield() - previous_yield
+        self._changed_hours.add(charge_hour.get_index())
+        self._columns.update(self._positions[charge_hour.get_index()], charge_hour)
+
+    def columns(self) -> ChargePlanColumns:
+        """Get the prices and power levels of the hours as NumPy arrays, for vectorized
+        calculations over the whole plan"""
+        return self._columns
+
+    def get_time_base(self) -> TimeBase:
+        """Get the time base that the index of the hours is counted from"""
+        if self._time_base is None:
+            return TimeBase.today()
+        return self._time_base
+
+    def set_initial_energy(self, energy: int | None) -> None:
+        """Set the energy (Wh) in the battery that the plan was created for"""
+        self._initial_energy = energy
+
+    def get_initial_energy(self) -> int | None:
+        """Get the energy (Wh) in the battery that the plan was created for, None if
+        the plan was not created by a planner"""
+        return self._initial_energy
+
+    def get_changed_hours(self) -> set[int]:
+        """Get the index of the hours that have changed power or price since the
+        last call to clear_changed_hours()"""
+        return self._changed_hours
+
+    def has_changed_hours(self) -> bool:
+        """Return True if any hour has changed since the last clear_changed_hours()"""
+        return len(self._changed_hours) > 0
+
+    def clear_changed_hours(self) -> None:
+        """Start a new tracking of changed hours"""
+        self._changed_hours = set()
 
     def is_scheduled(self, hour: datetime) -> bool:
         """Check if the hour is in the plan"""
-        return hour_iso_string(hour) in self._schedule
+        return self.get_time_base().index_of(hour) in self._positions
 
     def get(self, hour_iso: str) -> ChargeHour:
-        """Get ChargeHour object"""
-        return self._schedule[hour_iso]
+        """Get ChargeHour object by the hour in ISO string format"""
+        return self.get_by_dt(datetime.fromisoformat(hour_iso))
 
     def get_by_dt(self, hour: datetime) -> ChargeHour:
         """Get ChargeHour object by datetime"""
-        hour_iso = hour_iso_string(hour)
-        if hour_iso not in self._schedule:
+        time_base = self.get_time_base()
+        position = self._positions.get(time_base.index_of(hour))
+        if position is None:
             _LOGGER.warning(
                 "Tried to get value for hour (%s) that is not scheduled. "
                 "Returning 0 power and 0.0 price",
-                hour_iso,
+                hour,
             )
-            return ChargeHour(hour.hour, 0.0, 0.0, 0)
-        return self._schedule[hour_iso]
+            return ChargeHour(time_base.index_of(hour), 0.0, 0.0, 0, time_base)
+        return self._hours[position]
 
     def get_by_index(self, index: int) -> ChargeHour:
         """Get charge_hour by index"""
         try:
-            return self.get_hours_list()[index]
+            return self._hours[index]
         except IndexError as error:
             raise IndexError(f"Hour with index {index} not found") from error
 
@@ -83,57 +189,46 @@ class ChargePlan:
         filter_function: Callable[[ChargeHour], bool] | None = None,
     ) -> ChargeHour | None:
         """Get the next hour after the provided one"""
-        try:
-            if filter_function:
-                count = 0
-                while True:
-                    count += 1
-                    next_hour = self.get_by_index(self.index_of(charge_hour) + count)
-                    if filter_function(next_hour):
-                        return next_hour
-            return self.get_by_index(self.index_of(charge_hour) + 1)
-        except IndexError:
-            return None
+        for position in range(self.index_of(charge_hour) + 1, len(self._hours)):
+            next_hour = self._hours[position]
+            if filter_function is None or filter_function(next_hour):
+                return next_hour
+        return None
 
     def index_of(self, charge_hour: ChargeHour) -> int:
         """Get the index of a charge_hour"""
-        hour_in_list = self.get_by_dt(charge_hour.get_time())
-        return self.get_hours_list().index(hour_in_list)
+        key = charge_hour.get_index()
+        if charge_hour.get_time_base() is not self._time_base:
+            key = self.get_time_base().index_of(charge_hour.get_time())
+        try:
+            return self._positions[key]
+        except KeyError as error:
+            raise ValueError(f"{charge_hour} is not in the charge plan") from error
 
     def get_first(self) -> ChargeHour:
         """Get the first hour in charge plan"""
-        sorted_by_time = sorted(
-            self._schedule.values(), key=lambda hour: hour.get_time()
-        )
-        return sorted_by_time[0]
+        return self._hours[0]
 
     def get_last(self) -> ChargeHour:
         """Get the last hour in charge plan"""
-        sorted_by_time = sorted(
-            self._schedule.values(), key=lambda hour: hour.get_time()
-        )
-        return sorted_by_time[-1]
+        return self._hours[-1]
 
     def get_first_active_hour(self) -> ChargeHour | None:
         """Return the first hour that has been scheduled with a power level"""
-        for hour in self.get_hours_list():
-            if hour.get_power() != 0:
-                return hour
-        return None
+        return self._get_at_position(self._columns.first_active_position())
 
     def get_first_charging_hour(self) -> ChargeHour | None:
         """Return the first hour that has been scheduled with a power level below 0"""
-        for hour in self.get_hours_list():
-            if hour.get_power() < 0:
-                return hour
-        return None
+        return self._get_at_position(self._columns.first_charging_position())
 
     def get_first_discharging_hour(self) -> ChargeHour | None:
         """Return the first hour that has been scheduled with a power level above 0"""
-        for hour in self.get_hours_list():
-            if hour.get_power() > 0:
-                return hour
-        return None
+        return self._get_at_position(self._columns.first_discharging_position())
+
+    def _get_at_position(self, position: int | None) -> ChargeHour | None:
+        if position is None:
+            return None
+        return self._hours[position]
 
     def get_power(self, hour: datetime) -> int:
         """Get the scheduled power value for the given hour
@@ -160,9 +255,9 @@ class ChargePlan:
         hours: list[ChargeHour] = []
         if include_first:
             hours.append(hour1)
-        for hour in self.get_hours_list():
-            if hour1.get_time() < hour.get_time() < hour2.get_time():
-                hours.append(hour)
+        start = bisect_right(self._hours, hour1.get_time(), key=ChargeHour.get_time)
+        end = bisect_left(self._hours, hour2.get_time(), key=ChargeHour.get_time)
+        hours.extend(self._hours[start:end])
         if include_last:
             hours.append(hour2)
         return hours
@@ -173,7 +268,7 @@ class ChargePlan:
         sort_function: Callable[[ChargeHour], Any] | None = None,
     ) -> list[ChargeHour]:
         """Get all scheduled hours as a list"""
-        hours = list(self._schedule.values())
+        hours = list(self._hours)
         if filter_function:
             hours = list(filter(filter_function, hours))
         if sort_function:
@@ -181,21 +276,17 @@ class ChargePlan:
         return hours
 
     def get_hours_dict(self) -> dict[str, ChargeHour]:
-        """Get all scheduled hours"""
-        return self._schedule
+        """Get all scheduled hours, where the key is the hour in ISO string format"""
+        return {hour.hour_iso_string(): hour for hour in self._hours}
 
     def get_hours_serializeable(
         self,
     ) -> dict[str, dict[str, str | int | float]]:
         """Get all sceduled hours as a serializable object"""
         schedule: dict[str, dict[str, str | int | float]] = {}
-        for hour_iso, charge_hour in self._schedule.items():
+        for charge_hour in self._hours:
             charge_hour_dict = charge_hour.to_json()
-            try:
-                del charge_hour_dict["hour"]
-            except KeyError:
-                pass
-            schedule[hour_iso] = charge_hour_dict
+            schedule[str(charge_hour_dict.pop("hour"))] = charge_hour_dict
         return schedule
 
     # TODO: Shall this calculation include the battery average charge cost?
@@ -203,53 +294,46 @@ class ChargePlan:
     # The charge_plan should in that case have a battery object with inital values it
     # was created with.
     def expected_yield(self) -> float:
-        """Get expected financial yield of the planned charging and discharging"""
-        expected_yield = 0
-        for charge_hour in self._schedule.values():
-            power_kw = charge_hour.get_power() / 1000
-            price = charge_hour.get_active_price()
-            if price is None:
-                # Price might be None when plan is fetched from inverter
-                # -> Return 0.0
-                return 0.0
-            expected_yield = round(expected_yield + (power_kw * price), 2)
-        return expected_yield
+        """Get expected financial yield of the planned charging and discharging
+
+        The yield is kept as a running total that is updated when the hours change,
+        so this is O(1). Hours without a price (e.g. when the plan is fetched from
+        the inverter) do not add to the yield."""
+        return round(self._yield, 2)
 
     def get_average_charging_price(self) -> float:
         """Get the average charging price in currency/kWh"""
-        energy_added = 0
-        total_charging_price = 0
-        for charge_hour in self._schedule.values():
-            power_watts = charge_hour.get_power()
-            price_per_kwh = charge_hour.get_active_price()
-            if power_watts < 0:
-                power_watts = power_watts * -1
-                energy_added += power_watts
-                total_charging_price += (power_watts / 1000) * price_per_kwh
-
-        if energy_added > 0:
-            return total_charging_price / (energy_added / 1000)
-        return 0
+        return self._columns.average_charging_price()
+
+    def power_fingerprint(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> int:
+        """Get a hash of the scheduled power of the hours from start until end
+
+        Hours with 0 W are left out, so plans that schedule the same power at the same
+        times have the same fingerprint even if they do not have the same hours"""
+        return hash(
+            tuple(
+                (charge_hour.get_time(), charge_hour.get_power())
+                for charge_hour in self._hours
+                if charge_hour.get_power() != 0
+                and (start is None or charge_hour.get_time() >= start)
+                and (end is None or charge_hour.get_time() < end)
+            )
+        )
 
     def is_empty_plan(self) -> bool:
         """Return True if all power levels for the charge plan is 0"""
-        for charge_hour in self._schedule.values():
-            if charge_hour.get_power() != 0:
-                return False
-        return True
+        return self._columns.is_empty()
 
     def clone(self):
         """Create a new object as a clone of this instance"""
-        cloned_charge_plan = ChargePlan()
-        for charge_hour in self._schedule.values():
-            cloned_charge_plan.add_charge_hour(charge_hour.clone())
+        cloned_charge_plan = ChargePlan(self._time_base)
+        for charge_hour in self._hours:
+            cloned_charge_plan.add_charge_hour(charge_hour)
+        cloned_charge_plan.set_initial_energy(self._initial_energy)
         return cloned_charge_plan
 
     def len(self):
         """Get the length of the charge plan, i.e. the number of ChargeHours"""
-        return len(self.get_hours_dict())
-
-
-def hour_iso_string(hour: datetime) -> str:
-    """Get string representation of the hour as ISO format"""
-    return datetime.combine(hour.date(), time(hour=hour.hour)).isoformat()
+        return len(self._hours)
@@ -0,0 +1,169 @@
+"""Columnar storage of the prices and power levels of a charge plan"""
+
+import numpy as np
+
+from .charge_hour import ChargeHour
+
+
+class ChargePlanColumns:
+    """Import prices, export prices and power levels of the hours in a charge plan,
+    stored as NumPy arrays in the same order as the hours of the plan
+
+    The ChargePlan keeps the columns up to date when hours are added, removed or
+    changed. The arrays returned by the getters are read-only views of the storage,
+    so no data is copied."""
+
+    _length: int
+    _slot_hours: float
+    _import_prices: np.ndarray
+    _export_prices: np.ndarray
+    _powers: np.ndarray
+
+    def __init__(self, capacity: int = 48, slot_hours: float = 1.0):
+        self._length = 0
+        self._slot_hours = slot_hours
+        self._import_prices = np.zeros(capacity)
+        self._export_prices = np.zeros(capacity)
+        self._powers = np.zeros(capacity)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, charge_hour: ChargeHour) -> None:
+        """Add the hour after the last position"""
+        self._reserve(self._length + 1)
+        self._length += 1
+        self.update(self._length - 1, charge_hour)
+
+    def insert(self, position: int, charge_hour: ChargeHour) -> None:
+        """Add the hour at the position, moving later hours one step"""
+        self._reserve(self._length + 1)
+        for column in self._columns():
+            column[position + 1 : self._length + 1] = column[position : self._length]
+        self._length += 1
+        self.update(position, charge_hour)
+
+    def remove(self, position: int) -> None:
+        """Remove the hour at the position, moving later hours one step"""
+        for column in self._columns():
+            column[position : self._length - 1] = column[position + 1 : self._length]
+        self._length -= 1
+
+    def update(self, position: int, charge_hour: ChargeHour) -> None:
+        """Store prices and power of the hour at the position"""
+        self._import_prices[position] = _price(charge_hour.get_import_price())
+        self._export_prices[position] = _price(charge_hour.get_export_price())
+        self._powers[position] = charge_hour.get_power()
+
+    def _columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (self._import_prices, self._export_prices, self._powers)
+
+    def _reserve(self, length: int) -> None:
+        if length <= len(self._powers):
+            return
+        capacity = max(length, 2 * len(self._powers))
+        self._import_prices = _resized(self._import_prices, capacity)
+        self._export_prices = _resized(self._export_prices, capacity)
+        self._powers = _resized(self._powers, capacity)
+
+    def import_prices(self) -> np.ndarray:
+        """Import price (price/kWh) of each hour, NaN if the price is unknown"""
+        return _read_only(self._import_prices[: self._length])
+
+    def export_prices(self) -> np.ndarray:
+        """Export price (price/kWh) of each hour, NaN if the price is unknown"""
+        return _read_only(self._export_prices[: self._length])
+
+    def powers(self) -> np.ndarray:
+        """Power (W) of each hour, negative is charge and positive is discharge"""
+        return _read_only(self._powers[: self._length])
+
+    def active_prices(self) -> np.ndarray:
+        """Export price for discharging hours and import price for the other hours"""
+        return np.where(self.powers() > 0, self.export_prices(), self.import_prices())
+
+    def expected_yield(self) -> float:
+        """Get expected financial yield of the planned charging and discharging"""
+        energy = self.powers() / 1000 * self._slot_hours
+        return round(float(np.nansum(energy * self.active_prices())), 2)
+
+    def lowest_earlier_import_prices(self) -> np.ndarray:
+        """Lowest import price of the hours before each hour, inf for the first hour"""
+        lowest = np.full(self._length, np.inf)
+        if self._length > 1:
+            lowest[1:] = np.minimum.accumulate(self.import_prices()[:-1])
+        return lowest
+
+    def average_charging_price(self) -> float:
+        """Get the average charging price in currency/kWh"""
+        charging = self.powers() < 0
+        energy_added = -self.powers()[charging].sum()
+        if energy_added > 0:
+            charging_cost = -(self.powers()[charging] * self.import_prices()[charging])
+            return float(charging_cost.sum() / energy_added)
+        return 0
+
+    def is_empty(self) -> bool:
+        """Return True if all power levels are 0"""
+        return not self.powers().any()
+
+    def first_active_position(self) -> int | None:
+        """Position of the first hour with a power level, None if there is none"""
+        return _first(self.powers() != 0)
+
+    def first_charging_position(self) -> int | None:
+        """Position of the first hour with a power level below 0, None if there is none"""
+        return _first(self.powers() < 0)
+
+    def first_discharging_position(self) -> int | None:
+        """Position of the first hour with a power level above 0, None if there is none"""
+        return _first(self.powers() > 0)
+
+    def last_charging_position(self) -> int | None:
+        """Position of the last hour with a power level below 0, None if there is none"""
+        return _last(self.powers() < 0)
+
+    def last_discharging_position(self) -> int | None:
+        """Position of the last hour with a power level above 0, None if there is none"""
+        return _last(self.powers() > 0)
+
+    def energy_trajectory(self, initial_energy: float) -> np.ndarray:
+        """Energy level (Wh) of the battery at the end of each hour"""
+        return initial_energy - np.cumsum(self.powers()) * self._slot_hours
+
+    def soc_trajectory(self, initial_energy: float, capacity: int) -> np.ndarray:
+        """State of charge (%) of the battery at the end of each hour"""
+        return self.energy_trajectory(initial_energy) / capacity * 100
+
+
+def _price(price: float | None) -> float:
+    if price is None:
+        return np.nan
+    return price
+
+
+def _resized(column: np.ndarray, capacity: int) -> np.ndarray:
+    resized = np.zeros(capacity)
+    resized[: len(column)] = column
+    return resized
+
+
+def _read_only(view: np.ndarray) -> np.ndarray:
+    view.flags.writeable = False
+    return view
+
+
+def _first(condition: np.ndarray) -> int | None:
+    if condition.size == 0:
+        return None
+    position = int(condition.argmax())
+    if not condition[position]:
+        return None
+    return position
+
+
+def _last(condition: np.ndarray) -> int | None:
+    position = _first(condition[::-1])
+    if position is None:
+        return None
+    return len(condition) - 1 - position
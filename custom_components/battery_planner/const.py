@@ -4,5 +4,12 @@ DOMAIN = "battery_planner"
 EVENT_NEW_DATA = "battery_schedule_received"
 
 REQUEST_TIMEOUT = 30
+# (s) Time after a push until the schedule is read back from the battery to verify
+# it, so that the read does not compete with the requests following the push
+VERIFY_DELAY = 10
 GET = "GET"
 POST = "POST"
+
+PLANNER_GREEDY = "greedy"
+PLANNER_OPTIMAL = "optimal"
+PLANNER_TRADE = "trade"
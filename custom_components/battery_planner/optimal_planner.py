@@ -0,0 +1,174 @@
+"""Optimal planner module"""
+
+import logging
+
+import numpy as np
+
+from .charge_plan import ChargePlan
+from .battery import Battery
+from .planner import Planner, create_empty_plan
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OptimalPlanner(Planner):
+    """Planner that finds the charge plan with the highest yield by dynamic programming
+
+    The battery energy is discretized into states of `resolution` Wh and the best
+    transition between states is solved backwards over all hours (slots) in the plan.
+    Charging is valued at import price + battery cycle cost + price margin, and
+    discharging at export price, the same trade-off as the greedy Planner makes."""
+
+    _resolution: int
+
+    def __init__(
+        self,
+        battery_cycle_cost: float = 0,
+        price_margin: float = 0,
+        low_price_threshold: float = 0,
+        resolution: int = 10,
+        slot_minutes: int = 60,
+    ):
+        super().__init__(
+            battery_cycle_cost, price_margin, low_price_threshold, slot_minutes
+        )
+        self._resolution = resolution
+
+    def get_settings(self) -> tuple:
+        """Get the settings that the created plans depend on"""
+        return super().get_settings() + (self._resolution,)
+
+    def get_resolution(self) -> int:
+        """Get the size (Wh) of each energy state"""
+        return self._resolution
+
+    def create_price_arbitrage_plan(
+        self,
+        battery: Battery,
+        import_prices: list[float],
+        export_prices: list[float],
+        start_hour: int = 0,
+    ) -> ChargePlan:
+        """Charge plan is created for the period specified by the provided hours
+
+        battery - Battery to be charged and discharged
+        import_prices - Import prices (price/kWh) per slot, where the first item is
+        for 00:00 today
+        export_prices - Export prices (price/kWh) per slot, where the first item is
+        for 00:00 today
+        start_hour - The first slot (from midnight today) to create plan for
+
+        Returns a plan with 0 W for all hours if the return is to low"""
+
+        _LOGGER.debug("Creating optimal charge plan")
+        self._raise_if_cancelled()
+        time_base = self._time_base()
+        charge_plan = create_empty_plan(
+            start_hour,
+            import_prices[start_hour:],
+            export_prices[start_hour:],
+            time_base,
+        )
+        charge_plan.set_initial_energy(battery.get_energy())
+        if charge_plan.len() == 0:
+            return charge_plan
+
+        columns = charge_plan.columns()
+        slot_hours = time_base.get_slot_hours()
+        energy_steps = self._solve(
+            battery, columns.import_prices(), columns.export_prices(), slot_hours
+        )
+        for charge_hour, steps in zip(charge_plan.get_hours_list(), energy_steps):
+            charge_hour.set_power(int(-steps * self._resolution / slot_hours))
+
+        if charge_plan.is_empty_plan():
+            self._charge_if_price_is_below_threshold(battery.clone(), charge_plan)
+
+        return charge_plan
+
+    def _solve(
+        self,
+        battery: Battery,
+        import_prices: np.ndarray,
+        export_prices: np.ndarray,
+        slot_hours: float = 1.0,
+    ) -> list[int]:
+        """Return the change of energy level for each hour, in number of energy steps"""
+        resolution = self._resolution
+        min_energy = battery.min_energy_limit()
+        # The states are rounded down from the energy in the battery, the part of a
+        # step that is left over is kept in every state so the limits still hold
+        energy_above_min = battery.get_energy() - min_energy
+        initial_state = max(0, int(energy_above_min // resolution))
+        remainder = max(0.0, energy_above_min - initial_state * resolution)
+        max_state = int(
+            (battery.max_energy_limit() - min_energy - remainder) // resolution
+        )
+        state_count = max(0, max_state) + 1
+        initial_state = min(initial_state, state_count - 1)
+        charge_steps = int(battery.get_max_charge_power() * slot_hours) // resolution
+        discharge_steps = (
+            int(battery.get_max_discharge_power() * slot_hours) // resolution
+        )
+
+        states = np.arange(state_count, dtype=np.float64)
+        buy_prices = self._total_charge_cost(import_prices) * resolution / 1000
+        sell_prices = export_prices * resolution / 1000
+
+        # Energy already stored in the battery keeps the value it was charged for,
+        # any energy charged on top of that is worth nothing at the end of the plan
+        hold_price = self._total_charge_cost(battery.get_average_charge_cost())
+        values = np.empty((len(import_prices) + 1, state_count))
+        values[-1] = np.minimum(states, initial_state) * hold_price * resolution / 1000
+
+        for hour in range(len(import_prices) - 1, -1, -1):
+            self._raise_if_cancelled()
+            next_values = values[hour + 1]
+            charge_value = (
+                _window_max_ahead(next_values - buy_prices[hour] * states, charge_steps)
+                + buy_prices[hour] * states
+            )
+            discharge_value = (
+                _window_max_behind(
+                    next_values - sell_prices[hour] * states, discharge_steps
+                )
+                + sell_prices[hour] * states
+            )
+            values[hour] = np.maximum(charge_value, discharge_value)
+
+        energy_steps = []
+        state = initial_state
+        for hour in range(len(import_prices)):
+            lowest = max(0, state - discharge_steps)
+            highest = min(state_count - 1, state + charge_steps)
+            candidates = np.arange(lowest, highest + 1)
+            delta = candidates - state
+            candidate_values = values[hour + 1][lowest : highest + 1] + np.where(
+                delta > 0, -buy_prices[hour] * delta, -sell_prices[hour] * delta
+            )
+            next_state = state
+            # Stay idle unless another transition is strictly better
+            if candidate_values.max() > candidate_values[state - lowest] + 1e-9:
+                next_state = int(candidates[int(candidate_values.argmax())])
+            energy_steps.append(next_state - state)
+            state = next_state
+        return energy_steps
+
+
+def _window_max_ahead(values: np.ndarray, steps: int) -> np.ndarray:
+    """Maximum of values[k : k + steps + 1] for every k, truncated at the end
+
+    Uses the van Herk/Gil-Werman algorithm, linear in the number of values"""
+    width = steps + 1
+    count = len(values)
+    padded = np.full(((count + width - 1) // width + 1) * width, -np.inf)
+    padded[:count] = values
+    blocks = padded.reshape(-1, width)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:count], prefix[width - 1 : width - 1 + count])
+
+
+def _window_max_behind(values: np.ndarray, steps: int) -> np.ndarray:
+    """Maximum of values[k - steps : k + 1] for every k, truncated at the start"""
+    return _window_max_ahead(values[::-1], steps)[::-1]
@@ -0,0 +1,104 @@
+"""Cache of created charge plans"""
+
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Hashable
+
+from .battery import Battery
+from .charge_plan import ChargePlan
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PlanCache:
+    """Least recently used cache of charge plans, to not create the same plan again
+    when reschedule is called several times with the same prices
+
+    The cache is cleared when the plan would start at another time, since none of
+    the cached plans can be used after that."""
+
+    _max_size: int
+    _soc_tolerance: float
+    _plans: OrderedDict[Hashable, ChargePlan]
+    _start: tuple[datetime, int] | None
+    _hits: int
+    _misses: int
+
+    def __init__(self, max_size: int = 8, soc_tolerance: float = 1.0):
+        """max_size - Max number of plans to keep, 0 disables the cache
+        soc_tolerance - (%) Plans are reused for a state of charge within this step"""
+        self._max_size = max_size
+        self._soc_tolerance = soc_tolerance
+        self._plans = OrderedDict()
+        self._start = None
+        self._hits = 0
+        self._misses = 0
+
+    def create_key(
+        self,
+        battery: Battery,
+        battery_state_of_charge: float,
+        import_prices: list[float],
+        export_prices: list[float],
+        planner_settings: tuple,
+        incremental: bool = False,
+    ) -> Hashable:
+        """Create the key of a plan from everything the plan depends on
+
+        incremental - True if the plan is repaired from the previous plan, which
+        can give another plan than creating a new one"""
+        soc_step = battery_state_of_charge
+        if self._soc_tolerance > 0:
+            soc_step = round(battery_state_of_charge / self._soc_tolerance)
+        return (
+            hash((tuple(import_prices), tuple(export_prices))),
+            soc_step,
+            battery.get_capacity(),
+            battery.get_max_charge_power(),
+            battery.get_max_discharge_power(),
+            battery.get_upper_soc_limit(),
+            battery.get_lower_soc_limit(),
+            battery.get_average_charge_cost(),
+            planner_settings,
+            incremental,
+        )
+
+    def set_start(self, epoch: datetime, start_hour: int) -> None:
+        """Set the start of the plans to be cached, clears the cache if it has moved"""
+        start = (epoch, start_hour)
+        if start != self._start:
+            if self._plans:
+                _LOGGER.debug("Plan start moved, clearing %s cached plans", len(self))
+            self._plans.clear()
+            self._start = start
+
+    def get(self, key: Hashable) -> ChargePlan | None:
+        """Get a copy of the cached plan, None if there is no plan for the key"""
+        charge_plan = self._plans.get(key)
+        if charge_plan is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._plans.move_to_end(key)
+        return charge_plan.clone()
+
+    def put(self, key: Hashable, charge_plan: ChargePlan) -> None:
+        """Add a copy of the plan, removing the least recently used plan if full"""
+        if self._max_size <= 0:
+            return
+        self._plans[key] = charge_plan.clone()
+        self._plans.move_to_end(key)
+        while len(self._plans) > self._max_size:
+            self._plans.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached plans"""
+        self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get_statistics(self) -> dict[str, int]:
+        """Get number of cache hits and misses and the current size of the cache"""
+        return {"hits": self._hits, "misses": self._misses, "size": len(self)}
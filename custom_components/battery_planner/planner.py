@@ -1,10 +1,13 @@
 """Planner module"""
 
 import logging
+from typing import Callable, Iterable
 
 from .charge_plan import ChargePlan
 from .battery import Battery
 from .charge_hour import ChargeHour
+from .range_index import PriceIndex
+from .time_base import TimeBase
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -13,22 +16,56 @@ API_PATH = "custom_components.battery_planner.api"
 SECRETS_PATH = "secrets.json"
 
 
+class PlanningCancelled(Exception):
+    """Raised by a planner when the plan it is creating is no longer wanted"""
+
+
 class Planner:
     """Logic algorithm class that creates a charge plan based on a list of electricity prices"""
 
     _battery_cycle_cost: float
     _price_margin: float
     _low_price_threshold: float
+    _slot_minutes: int
+    _statistics: dict[str, int]
+    _is_cancelled: Callable[[], bool]
 
     def __init__(
         self,
         battery_cycle_cost: float = 0,
         price_margin: float = 0,
         low_price_threshold: float = 0,
+        slot_minutes: int = 60,
     ):
         self._battery_cycle_cost = battery_cycle_cost
         self._price_margin = price_margin
         self._low_price_threshold = low_price_threshold
+        self._slot_minutes = slot_minutes
+        self._statistics = {"plans": 0, "skipped_without_arbitrage": 0}
+        self._is_cancelled = lambda: False
+
+    def get_settings(self) -> tuple:
+        """Get the settings that the created plans depend on"""
+        return (
+            type(self).__name__,
+            self._battery_cycle_cost,
+            self._price_margin,
+            self._low_price_threshold,
+            self._slot_minutes,
+        )
+
+    def set_cancel_check(self, is_cancelled: Callable[[], bool]) -> None:
+        """Set a function that returns True when the plan being created is no longer
+        wanted, the planning is then stopped by raising PlanningCancelled
+
+        It is called from the thread that creates the plan, between the steps of
+        the planning"""
+        self._is_cancelled = is_cancelled
+
+    def get_statistics(self) -> dict[str, int]:
+        """Get number of created plans, and the number of them where the planning
+        was skipped since no charge cycle could be profitable"""
+        return dict(self._statistics)
 
     def create_price_arbitrage_plan(
         self,
@@ -46,9 +83,11 @@ class Planner:
         minimum SoC is set to e.g. 5%.
 
         battery - Battery to be charged and discharged
-        import_prices - Import prices (price/kWh) where the first item is for 00:00 today
-        export_prices - Export prices (price/kWh) where the first item is for 00:00 today
-        start_hour - The first hour (from midnight today) to create plan for
+        import_prices - Import prices (price/kWh) per slot, where the first item is
+        for 00:00 today
+        export_prices - Export prices (price/kWh) per slot, where the first item is
+        for 00:00 today
+        start_hour - The first slot (from midnight today) to create plan for
 
         Returns a plan with 0 W for all hours if the return is to low"""
 
@@ -56,72 +95,191 @@ class Planner:
         _LOGGER.debug(
             "Battery average charge cost = %s", battery.get_average_charge_cost()
         )
+        self._raise_if_cancelled()
 
         inital_battery = battery.clone()
+        initial_energy = battery.get_energy()
 
         battery_already_charged = False
         if not battery.is_empty():
             battery.set_soc(battery.get_lower_soc_limit())
             battery_already_charged = True
 
-        charge_plan = self._create_new_plan(
-            battery, import_prices, export_prices, start_hour
+        charge_plan = create_empty_plan(
+            start_hour,
+            import_prices[start_hour:],
+            export_prices[start_hour:],
+            self._time_base(),
         )
+        self._statistics["plans"] += 1
+        price_index: PriceIndex | None = None
+        if self._has_price_arbitrage(charge_plan):
+            price_index = _create_price_index(charge_plan)
+            self._create_new_plan(battery, charge_plan, price_index)
+        else:
+            _LOGGER.debug("No profitable charge cycle is possible, skipping planning")
+            self._statistics["skipped_without_arbitrage"] += 1
 
         if battery_already_charged:
+            if price_index is None:
+                price_index = _create_price_index(charge_plan)
             self._discharge_at_beginning_or_remove_planned_charging(
-                inital_battery, charge_plan
+                inital_battery, charge_plan, price_index
             )
 
         if charge_plan.is_empty_plan():
             self._charge_if_price_is_below_threshold(inital_battery, charge_plan)
 
+        charge_plan.set_initial_energy(initial_energy)
         return charge_plan
 
-    def _create_new_plan(
+    def repair_plan(
         self,
+        previous_plan: ChargePlan,
         battery: Battery,
         import_prices: list[float],
         export_prices: list[float],
-        start_hour: int,
-    ):
-        import_prices = import_prices[start_hour:]
-        export_prices = export_prices[start_hour:]
+        start_hour: int = 0,
+    ) -> ChargePlan | None:
+        """Reuse a plan created earlier by this planner, instead of creating a new plan
+
+        The elapsed hours of the previous plan are dropped and the planned power is
+        adjusted if the battery energy differs from the energy that was planned for
+        the start hour. Hours after the end of the previous plan, e.g. when the prices
+        of tomorrow have been published, are planned separately.
+
+        Returns None if the previous plan cannot be reused, i.e. if the prices of the
+        planned hours have changed or the repaired plan is not feasible"""
+        initial_energy = previous_plan.get_initial_energy()
+        charge_plan = create_empty_plan(
+            start_hour,
+            import_prices[start_hour:],
+            export_prices[start_hour:],
+            self._time_base(),
+        )
+        if initial_energy is None or charge_plan.len() == 0:
+            return None
+        try:
+            start_position = previous_plan.index_of(charge_plan.get_first())
+        except ValueError:
+            return None
+
+        hours = charge_plan.get_hours_list()
+        previous_hours = previous_plan.get_hours_list()[start_position:]
+        for charge_hour, previous_hour in zip(hours, previous_hours):
+            if (
+                charge_hour.get_time() != previous_hour.get_time()
+                or charge_hour.get_import_price() != previous_hour.get_import_price()
+                or charge_hour.get_export_price() != previous_hour.get_export_price()
+            ):
+                return None
+            charge_hour.set_power(previous_hour.get_power())
+
+        planned_energy = initial_energy
+        if start_position > 0:
+            planned_energy = previous_plan.columns().energy_trajectory(initial_energy)[
+                start_position - 1
+            ]
+        kept_hours = min(len(hours), len(previous_hours))
+        self._rebalance(hours[:kept_hours], battery.get_energy() - planned_energy)
+
+        if kept_hours < len(hours):
+            tail_battery = battery.clone()
+            tail_battery.set_energy(
+                int(
+                    charge_plan.columns().energy_trajectory(battery.get_energy())[
+                        kept_hours - 1
+                    ]
+                )
+            )
+            tail_plan = self.create_price_arbitrage_plan(
+                tail_battery,
+                import_prices,
+                export_prices,
+                hours[kept_hours].get_index(),
+            )
+            for charge_hour, tail_hour in zip(
+                hours[kept_hours:], tail_plan.get_hours_list()
+            ):
+                charge_hour.set_power(tail_hour.get_power())
+
+        charge_plan.set_initial_energy(battery.get_energy())
+        if not _is_feasible(charge_plan, battery):
+            _LOGGER.debug("Repaired plan is not feasible")
+            return None
+        return charge_plan
+
+    def _rebalance(self, charge_hours: list[ChargeHour], energy_difference: float):
+        """Charge less if the battery has more energy than planned, and discharge
+        less if it has less energy than planned, starting from the first hour"""
+        for charge_hour in charge_hours:
+            hours = charge_hour.get_duration_hours()
+            power = charge_hour.get_power()
+            if energy_difference > 0 and power < 0:
+                change = min(-power, int(energy_difference / hours))
+                charge_hour.set_power(power + change)
+                energy_difference -= change * hours
+            elif energy_difference < 0 and power > 0:
+                change = min(power, int(-energy_difference / hours))
+                charge_hour.set_power(power - change)
+                energy_difference += change * hours
+
+    def _has_price_arbitrage(self, charge_plan: ChargePlan) -> bool:
+        """Return True if any hour has an export price above the total charge cost
+        at the lowest import price before it. Otherwise no charge cycle can be
+        profitable, and the new plan would be empty.
+
+        This is O(n), using the running minimum of the import price"""
+        columns = charge_plan.columns()
+        total_charge_costs = self._total_charge_cost(
+            columns.lowest_earlier_import_prices()
+        )
+        return bool((total_charge_costs < columns.export_prices()).any())
 
-        charge_plan = create_empty_plan(start_hour, import_prices, export_prices)
+    def _create_new_plan(
+        self, battery: Battery, charge_plan: ChargePlan, price_index: PriceIndex
+    ) -> None:
         initial_battery = battery.clone()
+        charge_hours = charge_plan.get_hours_list()
 
         expected_yield = charge_plan.expected_yield()
-        self._charge_low_and_discharge_high(charge_plan.get_hours_list(), battery)
+        charge_plan.clear_changed_hours()
+        self._charge_low_and_discharge_high(
+            charge_hours, price_index, 0, len(charge_hours), battery
+        )
 
-        while expected_yield != charge_plan.expected_yield():
+        # Fill gaps until a pass no longer changes any hour or the yield
+        while (
+            charge_plan.has_changed_hours()
+            and expected_yield != charge_plan.expected_yield()
+        ):
+            self._raise_if_cancelled()
             expected_yield = charge_plan.expected_yield()
+            charge_plan.clear_changed_hours()
             self._find_and_fill_gaps(
-                charge_plan.get_hours_list(), initial_battery.clone()
+                charge_plan, charge_hours, price_index, initial_battery.clone()
             )
 
-        return charge_plan
-
     def _charge_low_and_discharge_high(
         self,
         charge_hours: list[ChargeHour],
+        price_index: PriceIndex,
+        start: int,
+        end: int,
         battery: Battery,
         reverse: bool = False,
     ) -> None:
-        lowest_import_price: list[ChargeHour] = sorted(
-            charge_hours, key=lambda hour: hour.get_import_price()
-        )
-        highest_export_first: list[ChargeHour] = sorted(
-            charge_hours,
-            key=lambda hour: hour.get_export_price(),
-            reverse=True,
-        )
+        """Charge at the lowest and discharge at the highest prices of the hours
+        at the positions [start, end) of charge_hours, which must be sorted by time"""
         initial_average_charge_cost = battery.get_average_charge_cost()
         last_charged_hour_index = self._charge_battery_full_at_lowest_price(
-            lowest_import_price, highest_export_first, battery, reverse
+            charge_hours, price_index, start, end, battery, reverse
         )
         self._discharge_at_highest_priced_hours(
-            highest_export_first,
+            (
+                charge_hours[position]
+                for position in price_index.highest_export_first(start, end)
+            ),
             last_charged_hour_index,
             battery,
             initial_average_charge_cost,
@@ -130,42 +288,63 @@ class Planner:
 
     def _charge_battery_full_at_lowest_price(
         self,
-        lowest_import_first: list[ChargeHour],
-        highest_export_first: list[ChargeHour],
+        charge_hours: list[ChargeHour],
+        price_index: PriceIndex,
+        start: int,
+        end: int,
         battery: Battery,
         reverse: bool = False,
     ) -> int:
+        """For each discharge hour, from the highest export price, charge at the hours
+        with lowest import price before it (after it if reverse) until the battery is full
+
+        The candidate charge hours are taken from the range index in price order and
+        the search stops at the first one that is too expensive, so only hours that
+        can actually be charged are visited"""
+        max_charge_cost = self._total_charge_cost(battery.get_average_charge_cost())
         last_charged_hour_index = -1
-        for discharge_hour in highest_export_first:
-            for charge_hour in lowest_import_first:
-                charge_comes_before_discharge = (
-                    charge_hour.get_index() < discharge_hour.get_index()
-                )
-                if reverse:
-                    charge_comes_before_discharge = (
-                        charge_hour.get_index() > discharge_hour.get_index()
-                    )
-                if (
-                    charge_comes_before_discharge
-                    and self._total_charge_cost(charge_hour.get_import_price())
-                    < discharge_hour.get_export_price()
-                    and discharge_hour.get_export_price()
-                    > self._total_charge_cost(battery.get_average_charge_cost())
-                    and not battery.is_full()
-                    and charge_hour.get_power() == 0
+        for discharge_position in price_index.highest_export_first(start, end):
+            export_price = charge_hours[discharge_position].get_export_price()
+            if battery.is_full() or export_price <= max_charge_cost:
+                # The remaining hours have an even lower export price
+                break
+
+            charge_start, charge_end = start, discharge_position
+            if reverse:
+                charge_start, charge_end = discharge_position + 1, end
+
+            for position in price_index.lowest_import_first(charge_start, charge_end):
+                charge_hour = charge_hours[position]
+                if self._total_charge_cost(charge_hour.get_import_price()) >= (
+                    export_price
                 ):
-                    charge_hour.set_power(
-                        battery.charge_max_power_for_one_hour(charge_hour)
-                    )
-                    last_charged_hour_index = charge_hour.get_index()
+                    break
+                if charge_hour.get_power() != 0:
+                    continue
+                charge_hour.set_power(
+                    battery.charge_max_power_for_one_hour(charge_hour)
+                )
+                last_charged_hour_index = charge_hour.get_index()
+                max_charge_cost = self._total_charge_cost(
+                    battery.get_average_charge_cost()
+                )
+                if battery.is_full() or export_price <= max_charge_cost:
+                    break
         return last_charged_hour_index
 
+    def _raise_if_cancelled(self) -> None:
+        if self._is_cancelled():
+            raise PlanningCancelled()
+
+    def _time_base(self) -> TimeBase:
+        return TimeBase.today(self._slot_minutes)
+
     def _total_charge_cost(self, import_price: float):
         return import_price + self._battery_cycle_cost + self._price_margin
 
     def _discharge_at_highest_priced_hours(
         self,
-        highest_export_first: list[ChargeHour],
+        highest_export_first: Iterable[ChargeHour],
         last_charged_hour_index: int,
         battery: Battery,
         inital_average_charge_cost: float,
@@ -176,6 +355,11 @@ class Planner:
             average_charge_cost = inital_average_charge_cost
 
         for discharge_hour in highest_export_first:
+            if battery.is_empty() or discharge_hour.get_export_price() <= (
+                self._total_charge_cost(average_charge_cost)
+            ):
+                # The remaining hours have an even lower export price
+                break
             discharge_comes_after_last_charge = (
                 discharge_hour.get_index() > last_charged_hour_index
             )
@@ -183,74 +367,88 @@ class Planner:
                 discharge_comes_after_last_charge = (
                     discharge_hour.get_index() < last_charged_hour_index
                 )
-            if (
-                (not battery.is_empty())
-                and discharge_hour.get_export_price()
-                > self._total_charge_cost(average_charge_cost)
-                and discharge_comes_after_last_charge
-            ):
-                discharge_hour.set_power(battery.discharge_max_power_for_one_hour())
+            if discharge_comes_after_last_charge:
+                discharge_hour.set_power(
+                    battery.discharge_max_power_for_one_hour(
+                        discharge_hour.get_duration_hours()
+                    )
+                )
 
     def _find_and_fill_gaps(
-        self, charge_hours: list[ChargeHour], battery: Battery
+        self,
+        charge_plan: ChargePlan,
+        charge_hours: list[ChargeHour],
+        price_index: PriceIndex,
+        battery: Battery,
     ) -> None:
-        charge_hours = sorted(charge_hours, key=lambda h: h.get_time())
-
-        charging_hours: list[ChargeHour] = list(
-            filter(lambda h: h.get_power() < 0, charge_hours)
+        """Plan the gaps before, between and after the planned charging and
+        discharging, where charge_hours are the hours of charge_plan"""
+        columns = charge_plan.columns()
+        hour_count = len(charge_hours)
+
+        first_charge_index = _position_or(columns.first_charging_position(), -1)
+        last_charge_index = _position_or(columns.last_charging_position(), -1)
+        first_discharge_index = _position_or(
+            columns.first_discharging_position(), hour_count
         )
-        discharging_hours: list[ChargeHour] = list(
-            filter(lambda h: h.get_power() > 0, charge_hours)
+        last_discharge_index = _position_or(
+            columns.last_discharging_position(), hour_count
         )
 
-        first_charge_index = -1
-        last_charge_index = -1
-        if charging_hours:
-            first_charge_index = charge_hours.index(charging_hours[0])
-            last_charge_index = charge_hours.index(charging_hours[-1])
-
-        first_discharge_index = len(charge_hours)
-        last_discharge_index = len(charge_hours)
-        if discharging_hours:
-            first_discharge_index = charge_hours.index(discharging_hours[0])
-            last_discharge_index = charge_hours.index(discharging_hours[-1])
-
         # Gap before first charge
         if 0 < first_charge_index < first_discharge_index:
-            hours = charge_hours[0:first_charge_index]
-            self._charge_low_and_discharge_high(hours, battery)
+            self._charge_low_and_discharge_high(
+                charge_hours, price_index, 0, first_charge_index, battery
+            )
 
         # Gap before first discharge when battery was charged from start
-        elif first_discharge_index < len(charge_hours):
-            hours = charge_hours[0:first_discharge_index]
+        elif first_discharge_index < hour_count:
             empty_battery = battery.empty_clone(True)
             empty_battery.set_average_charge_cost(battery.get_average_charge_cost())
-            self._charge_low_and_discharge_high(hours, empty_battery, reverse=True)
+            self._charge_low_and_discharge_high(
+                charge_hours,
+                price_index,
+                0,
+                first_discharge_index,
+                empty_battery,
+                reverse=True,
+            )
 
         # Gap between charge and discharge
-        if -1 < last_charge_index < first_discharge_index < len(charge_hours):
-            hours = charge_hours[last_charge_index + 1 : first_discharge_index]
+        if -1 < last_charge_index < first_discharge_index < hour_count:
             self._charge_low_and_discharge_high(
-                hours, battery.empty_clone(True), reverse=True
+                charge_hours,
+                price_index,
+                last_charge_index + 1,
+                first_discharge_index,
+                battery.empty_clone(True),
+                reverse=True,
             )
 
         # Gap after last discharge
-        if last_charge_index < last_discharge_index < len(charge_hours):
-            hours = charge_hours[last_discharge_index + 1 :]
-            self._charge_low_and_discharge_high(hours, battery.empty_clone(True))
+        if last_charge_index < last_discharge_index < hour_count:
+            self._charge_low_and_discharge_high(
+                charge_hours,
+                price_index,
+                last_discharge_index + 1,
+                hour_count,
+                battery.empty_clone(True),
+            )
 
     def _discharge_at_beginning_or_remove_planned_charging(
-        self, inital_battery: Battery, charge_plan: ChargePlan
+        self, inital_battery: Battery, charge_plan: ChargePlan, price_index: PriceIndex
     ):
         first_charge_hour = charge_plan.get_first_charging_hour()
         if first_charge_hour:
-            self._discharge_before_hour(inital_battery, charge_plan, first_charge_hour)
+            self._discharge_before_hour(
+                inital_battery, charge_plan, price_index, first_charge_hour
+            )
             self._unschedule_charging_equal_to_battery_avalable_energy(
                 inital_battery, charge_plan, first_charge_hour
             )
         else:  # The charge plan is empty
             self._discharge_before_hour(
-                inital_battery, charge_plan, charge_plan.get_last()
+                inital_battery, charge_plan, price_index, charge_plan.get_last()
             )
 
     def _unschedule_charging_equal_to_battery_avalable_energy(
@@ -264,29 +462,29 @@ class Planner:
             and charge_hour
             and charge_hour.get_power() <= 0
         ):
-            power = min(
-                charge_hour.get_power() + inital_battery.get_available_energy(),
-                0,
-            )
+            hours = charge_hour.get_duration_hours()
+            available_power = int(inital_battery.get_available_energy() / hours)
+            power = min(charge_hour.get_power() + available_power, 0)
             inital_battery.discharge(
-                min(
-                    charge_hour.get_absolute_power(),
-                    inital_battery.get_available_energy(),
-                )
+                min(charge_hour.get_absolute_power(), available_power), hours
             )
             charge_hour.set_power(power)
             charge_hour = charge_plan.get_next_after(charge_hour)
 
     def _discharge_before_hour(
-        self, inital_battery: Battery, charge_plan: ChargePlan, charge_hour: ChargeHour
+        self,
+        inital_battery: Battery,
+        charge_plan: ChargePlan,
+        price_index: PriceIndex,
+        charge_hour: ChargeHour,
     ):
-        highest_export_first: list[ChargeHour] = sorted(
-            charge_plan.get_hours_list()[: charge_plan.index_of(charge_hour)],
-            key=lambda hour: hour.get_export_price(),
-            reverse=True,
-        )
         self._discharge_at_highest_priced_hours(
-            highest_export_first,
+            (
+                charge_plan.get_by_index(position)
+                for position in price_index.highest_export_first(
+                    0, charge_plan.index_of(charge_hour)
+                )
+            ),
             -1,
             inital_battery,
             inital_battery.get_average_charge_cost(),
@@ -305,12 +503,49 @@ class Planner:
                 hour.set_power(battery.charge_max_power_for_one_hour(hour))
 
 
+def _create_price_index(charge_plan: ChargePlan) -> PriceIndex:
+    columns = charge_plan.columns()
+    return PriceIndex(
+        columns.import_prices().tolist(), columns.export_prices().tolist()
+    )
+
+
+def _position_or(position: int | None, default: int) -> int:
+    if position is None:
+        return default
+    return position
+
+
+def _is_feasible(charge_plan: ChargePlan, battery: Battery) -> bool:
+    """Return True if the power of all hours is within the power limits of the
+    battery, and the energy stays within the SoC limits when charging or discharging"""
+    columns = charge_plan.columns()
+    powers = columns.powers()
+    if (powers < -battery.get_max_charge_power()).any() or (
+        powers > battery.get_max_discharge_power()
+    ).any():
+        return False
+    # Allow for the rounding of power and energy to whole W and Wh
+    tolerance = 1
+    energy = columns.energy_trajectory(battery.get_energy())
+    below_lower_limit = energy < battery.min_energy_limit() - tolerance
+    above_upper_limit = energy > battery.max_energy_limit() + tolerance
+    return (
+        not ((powers > 0) & below_lower_limit).any()
+        and not ((powers < 0) & above_upper_limit).any()
+    )
+
+
 def create_empty_plan(
     start_hour: int = 0,
     import_prices: list[float] = [],
     export_prices: list[float] = [],
+    time_base: TimeBase | None = None,
 ) -> ChargePlan:
-    """Pair prices with correct hour and create a charge plan with no power set"""
+    """Pair prices with correct hour and create a charge plan with no power set
+
+    The index of the hours is counted from time_base, midnight today with one hour
+    slots if not set. Without prices the plan lasts until the end of tomorrow."""
     if len(import_prices) != len(export_prices):
         raise ValueError(
             "Price arrays are of different length!\nlen(import_prices) = %s\nlen(export_prices) = %s",
@@ -318,18 +553,22 @@ def create_empty_plan(
             len(export_prices),
         )
 
+    if time_base is None:
+        time_base = TimeBase.today()
+
     if not import_prices and not export_prices:
-        plan_length = 48 - start_hour
+        plan_length = 2 * time_base.slots_per_day() - start_hour
         import_prices = [0.0] * plan_length
         export_prices = [0.0] * plan_length
 
-    charge_plan = ChargePlan()
+    charge_plan = ChargePlan(time_base)
     for index, import_price in enumerate(import_prices):
         charge_hour_with_price = ChargeHour(
             hour=index + start_hour,
             import_price=import_price,
             export_price=export_prices[index],
             power=0,
+            time_base=time_base,
         )
         charge_plan.add_charge_hour(charge_hour_with_price)
     return charge_plan
@@ -0,0 +1,90 @@
+"""Range index to find the lowest value within a range of hours"""
+
+import heapq
+from typing import Iterator, Sequence
+
+
+class SparseTable:
+    """Static index answering range minimum queries in constant time
+
+    The table is built in O(n log n). Equal keys are resolved to the leftmost
+    position, which gives the same order as a stable sort of the keys."""
+
+    _keys: list[float]
+    _table: list[list[int]]
+
+    def __init__(self, keys: Sequence[float]):
+        self._keys = list(keys)
+        self._table = [list(range(len(self._keys)))]
+        width = 1
+        while 2 * width <= len(self._keys):
+            previous = self._table[-1]
+            self._table.append(
+                [
+                    self._leftmost_min(previous[position], previous[position + width])
+                    for position in range(len(self._keys) - 2 * width + 1)
+                ]
+            )
+            width *= 2
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _leftmost_min(self, left: int, right: int) -> int:
+        if self._keys[right] < self._keys[left]:
+            return right
+        return left
+
+    def argmin(self, start: int, end: int) -> int:
+        """Get the position of the lowest key in the range [start, end)"""
+        if not 0 <= start < end <= len(self._keys):
+            raise IndexError(f"Range [{start}, {end}) is empty or out of bounds")
+        level = (end - start).bit_length() - 1
+        row = self._table[level]
+        return self._leftmost_min(row[start], row[end - (1 << level)])
+
+    def iter_sorted(self, start: int = 0, end: int | None = None) -> Iterator[int]:
+        """Iterate over the positions in the range [start, end) from lowest to highest key
+
+        Each step costs O(log n), so iterating over the first few positions of a
+        range is much cheaper than sorting the range"""
+        if end is None:
+            end = len(self._keys)
+        heap: list[tuple[float, int, int, int]] = []
+
+        def push(range_start: int, range_end: int):
+            if range_start < range_end:
+                position = self.argmin(range_start, range_end)
+                heapq.heappush(
+                    heap, (self._keys[position], position, range_start, range_end)
+                )
+
+        push(start, end)
+        while heap:
+            _, position, range_start, range_end = heapq.heappop(heap)
+            yield position
+            push(range_start, position)
+            push(position + 1, range_end)
+
+
+class PriceIndex:
+    """Range indexes over the prices of the hours of a charge plan, to get the hours
+    of any range of positions by lowest import or highest export price
+
+    The indexes are built once per plan, since the prices do not change while
+    the plan is created"""
+
+    _lowest_import: SparseTable
+    _highest_export: SparseTable
+
+    def __init__(self, import_prices: Sequence[float], export_prices: Sequence[float]):
+        self._lowest_import = SparseTable(import_prices)
+        self._highest_export = SparseTable([-price for price in export_prices])
+
+    def lowest_import_first(self, start: int, end: int) -> Iterator[int]:
+        """Iterate over the positions in [start, end) from lowest import price"""
+        return self._lowest_import.iter_sorted(start, end)
+
+    def highest_export_first(self, start: int, end: int) -> Iterator[int]:
+        """Iterate over the positions in [start, end) from highest export price"""
+        return self._highest_export.iter_sorted(start, end)
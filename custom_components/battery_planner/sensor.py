@@ -64,6 +64,7 @@ class BatteryScheduleSensor(SensorEntity):
 
     _charge_plan: ChargePlan
     _expected_yield: float | None
+    _average_charging_price: float | None
 
     def __init__(
         self,
@@ -83,6 +84,7 @@ class BatteryScheduleSensor(SensorEntity):
 
         self._charge_plan: ChargePlan = ChargePlan()
         self._expected_yield = None
+        self._average_charging_price = None
 
         self._attr_device_class = SensorDeviceClass.POWER
         self._attr_state_class = SensorStateClass.MEASUREMENT
@@ -126,6 +128,9 @@ class BatteryScheduleSensor(SensorEntity):
             "export_prices": [],
             "schedule": self._charge_plan.get_hours_serializeable(),
             "expected_yield": self._expected_yield,
+            "average_charging_price": self._average_charging_price,
+            "slot_minutes": self._battery_planner.get_slot_minutes(),
+            "statistics": self._battery_planner.get_statistics(),
         }
 
     async def _update(self) -> None:
@@ -135,6 +140,9 @@ class BatteryScheduleSensor(SensorEntity):
         _LOGGER.debug("Received charge plan from API:\n%s", self._charge_plan)
         self._attr_native_value = self._charge_plan.get_power(datetime.now())
         self._expected_yield = self._charge_plan.expected_yield()
+        self._average_charging_price = round(
+            self._charge_plan.get_average_charging_price(), 2
+        )
         self.async_write_ha_state()
 
     async def async_added_to_hass(self) -> None:
@@ -0,0 +1,71 @@
+"""Shared time reference for the hours of a charge plan"""
+
+from datetime import date, datetime, time, timedelta
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class TimeBase:
+    """The epoch (midnight of a day) that the index of ChargeHour objects is counted
+    from, where index 0 is the epoch itself, and the length of each slot of time.
+
+    Hours of a charge plan share one TimeBase, so their timestamps are consistent
+    even if they are created on different sides of midnight, and the clock does not
+    need to be read for every hour. The slots are one hour long by default, but can
+    be any length that a day can be evenly divided by, e.g. 15 minutes."""
+
+    __slots__ = ("_epoch", "_slot_minutes")
+
+    _today: dict[int, "TimeBase"] = {}
+
+    _epoch: datetime
+    _slot_minutes: int
+
+    def __init__(self, epoch: datetime | None = None, slot_minutes: int = 60):
+        if epoch is None:
+            epoch = datetime.now()
+        if slot_minutes <= 0 or MINUTES_PER_DAY % slot_minutes != 0:
+            raise ValueError(
+                f"Slot length of {slot_minutes} minutes does not evenly divide a day"
+            )
+        self._epoch = datetime.combine(epoch.date(), time(0))
+        self._slot_minutes = slot_minutes
+
+    @classmethod
+    def today(cls, slot_minutes: int = 60) -> "TimeBase":
+        """Get a shared TimeBase with the epoch at midnight today"""
+        today = date.today()
+        time_base = cls._today.get(slot_minutes)
+        if time_base is None or time_base.get_epoch().date() != today:
+            time_base = TimeBase(datetime.combine(today, time(0)), slot_minutes)
+            cls._today[slot_minutes] = time_base
+        return time_base
+
+    def __repr__(self):
+        return f"TimeBase({self._epoch.isoformat()}, {self._slot_minutes} min)"
+
+    def get_epoch(self) -> datetime:
+        """Get the datetime of index 0"""
+        return self._epoch
+
+    def get_slot_minutes(self) -> int:
+        """Get the length of each slot in minutes"""
+        return self._slot_minutes
+
+    def get_slot_hours(self) -> float:
+        """Get the length of each slot in hours, to convert power (W) to energy (Wh)"""
+        return self._slot_minutes / 60
+
+    def slots_per_day(self) -> int:
+        """Get the number of slots in one day"""
+        return MINUTES_PER_DAY // self._slot_minutes
+
+    def time_of(self, index: int) -> datetime:
+        """Get the start of the slot with the given index"""
+        return self._epoch + timedelta(minutes=index * self._slot_minutes)
+
+    def index_of(self, hour: datetime) -> int:
+        """Get the index of the slot that the datetime is within"""
+        days = (hour.date() - self._epoch.date()).days
+        minute_of_day = hour.hour * 60 + hour.minute
+        return days * self.slots_per_day() + minute_of_day // self._slot_minutes
@@ -0,0 +1,187 @@
+"""Trade planner module"""
+
+import logging
+
+import numpy as np
+
+from .battery import Battery
+from .charge_hour import ChargeHour
+from .charge_plan import ChargePlan
+from .planner import Planner
+from .range_index import PriceIndex
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TradePlanner(Planner):
+    """Planner that finds the most profitable charge cycles as trades, where energy
+    is bought at one hour and sold at a later hour
+
+    The k best non-overlapping trades are found in O(n*k) by dynamic programming,
+    where k is the max number of cycles per day times the number of calendar days
+    that the plan covers. The limit is for the whole plan, so one day can get more
+    cycles than max_daily_cycles if another day gets fewer. Each trade is then
+    expanded to the hours around it by the greedy Planner, within the power and SoC
+    limits of the battery."""
+
+    _max_daily_cycles: int
+
+    def __init__(
+        self,
+        battery_cycle_cost: float = 0,
+        price_margin: float = 0,
+        low_price_threshold: float = 0,
+        max_daily_cycles: int = 2,
+        slot_minutes: int = 60,
+    ):
+        super().__init__(
+            battery_cycle_cost, price_margin, low_price_threshold, slot_minutes
+        )
+        self._max_daily_cycles = max_daily_cycles
+
+    def get_settings(self) -> tuple:
+        """Get the settings that the created plans depend on"""
+        return super().get_settings() + (self._max_daily_cycles,)
+
+    def _create_new_plan(
+        self, battery: Battery, charge_plan: ChargePlan, price_index: PriceIndex
+    ) -> None:
+        """Plan one charge cycle for each of the best trades, in time order
+
+        Each trade gets the hours from the hour after the previous sale until the
+        hour of its own sale, the last trade also gets the remaining hours. The same
+        battery is used for all trades, so energy that is left after one cycle is
+        used by the next one, at the charge cost of that energy. The gaps are not
+        filled like in the greedy Planner, since the trades already cover the most
+        profitable cycles."""
+        charge_hours = charge_plan.get_hours_list()
+        days = 0
+        if charge_hours:
+            days = (
+                charge_hours[-1].get_time().date() - charge_hours[0].get_time().date()
+            ).days + 1
+        columns = charge_plan.columns()
+        trades = self._best_trades(
+            self._total_charge_cost(columns.import_prices()),
+            columns.export_prices(),
+            self._max_daily_cycles * days,
+        )
+        _LOGGER.debug("Best trades (buy, sell) = %s", trades)
+
+        start = 0
+        for number, (_, sell_position) in enumerate(trades):
+            end = sell_position + 1
+            if number == len(trades) - 1:
+                end = len(charge_hours)
+            if battery.is_empty():
+                # Energy sold by the previous trade does not make the next one cost more
+                battery.set_average_charge_cost(0.0)
+            self._charge_low_and_discharge_high(
+                charge_hours, price_index, start, end, battery
+            )
+            start = end
+
+    def _discharge_at_beginning_or_remove_planned_charging(
+        self, inital_battery: Battery, charge_plan: ChargePlan, price_index: PriceIndex
+    ):
+        """The trades are planned for an empty battery, so after the energy already
+        in the battery has been discharged or replaced the first charging, the
+        charging is reduced where the energy that is still left would make the
+        battery go above the upper SoC limit"""
+        energy = inital_battery.get_energy()
+        max_energy = inital_battery.max_energy_limit()
+        super()._discharge_at_beginning_or_remove_planned_charging(
+            inital_battery, charge_plan, price_index
+        )
+        for charge_hour in charge_plan.get_hours_list():
+            hours = charge_hour.get_duration_hours()
+            power = charge_hour.get_power()
+            if power < 0:
+                power = max(power, -int(max(0, max_energy - energy) / hours))
+                charge_hour.set_power(power)
+            energy -= power * hours
+
+    def _charge_low_and_discharge_high(
+        self,
+        charge_hours: list[ChargeHour],
+        price_index: PriceIndex,
+        start: int,
+        end: int,
+        battery: Battery,
+        reverse: bool = False,
+    ) -> None:
+        """Charge at the lowest and discharge at the highest prices of the hours
+        at the positions [start, end) of charge_hours, which must be sorted by time
+
+        Discharging is only done after the latest charged hour (before the earliest
+        if reverse), so that a trade never sells energy that is bought later"""
+        initial_average_charge_cost = battery.get_average_charge_cost()
+        idle_positions = [
+            position
+            for position in range(start, end)
+            if charge_hours[position].get_power() == 0
+        ]
+        self._charge_battery_full_at_lowest_price(
+            charge_hours, price_index, start, end, battery, reverse
+        )
+        charged_hour_indexes = [
+            charge_hours[position].get_index()
+            for position in idle_positions
+            if charge_hours[position].get_power() < 0
+        ]
+        last_charged_hour_index = -1
+        if charged_hour_indexes:
+            last_charged_hour_index = (
+                min(charged_hour_indexes) if reverse else max(charged_hour_indexes)
+            )
+        self._discharge_at_highest_priced_hours(
+            (
+                charge_hours[position]
+                for position in price_index.highest_export_first(start, end)
+            ),
+            last_charged_hour_index,
+            battery,
+            initial_average_charge_cost,
+            reverse,
+        )
+
+    def _best_trades(
+        self, buy_prices: np.ndarray, sell_prices: np.ndarray, max_trades: int
+    ) -> list[tuple[int, int]]:
+        """Positions (buy, sell) of the at most max_trades non-overlapping trades
+        with the highest total profit, sorted by time
+
+        free[i, t] is the best profit before position i with t completed trades, and
+        hold[i, t] the best profit when the trade number t has been bought"""
+        count = len(buy_prices)
+        if count == 0 or max_trades <= 0:
+            return []
+        free = np.full((count + 1, max_trades + 1), -np.inf)
+        hold = np.full((count + 1, max_trades + 1), -np.inf)
+        free[0, 0] = 0.0
+        for position in range(count):
+            free[position + 1] = np.maximum(
+                free[position], hold[position] + sell_prices[position]
+            )
+            hold[position + 1, 1:] = np.maximum(
+                hold[position, 1:], free[position, :-1] - buy_prices[position]
+            )
+
+        # Follow the decisions backwards from the best final state, preferring to
+        # keep the state unchanged so that trades without profit are not made
+        trades: list[tuple[int, int]] = []
+        trade = int(np.argmax(free[count]))
+        holding = False
+        sell_position = -1
+        for position in range(count - 1, -1, -1):
+            if trade == 0:
+                break
+            if not holding and free[position + 1, trade] != free[position, trade]:
+                holding = True
+                sell_position = position
+            elif holding and hold[position + 1, trade] != hold[position, trade]:
+                trades.append((position, sell_position))
+                holding = False
+                trade -= 1
+        trades.reverse()
+        return trades
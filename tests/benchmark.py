@@ -0,0 +1,355 @@
+"""Planner and battery API benchmark, not part of the test suite
+
+Run from the repository root with: python -m tests.benchmark"""
+
+import asyncio
+import json
+import math
+import random
+from datetime import datetime, timedelta
+from statistics import median
+from time import perf_counter
+
+import requests
+from aiohttp import web
+
+from custom_components.battery_planner.api.fronius_solarnet_api.digest_auth_request import (
+    DigestAuthRequest,
+    create_auth_header,
+    parse_auth_data_from_response,
+    parse_parameter_from_auth_data,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.fronius_solarnet_api import (
+    FroniusSolarnetApi,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.solarnet_charge_schedule import (
+    SolarnetChargeSchedule,
+)
+from custom_components.battery_planner.battery import Battery
+from custom_components.battery_planner.const import GET
+from custom_components.battery_planner.optimal_planner import OptimalPlanner
+from custom_components.battery_planner.planner import Planner
+from custom_components.battery_planner.trade_planner import TradePlanner
+
+RUNS = 20
+HTTP_REQUESTS = 200
+# (ms) Time budget of a 48 hour optimal plan at 10 Wh resolution
+OPTIMAL_BUDGET_MS = 100
+NONCE_USES = 100
+TIMEOFUSE_URI = "/config/timeofuse"
+
+
+def create_battery() -> Battery:
+    battery = Battery(
+        capacity=7700,
+        max_charge_power=4000,
+        max_discharge_power=4000,
+        upper_soc_limit=90,
+        lower_soc_limit=10,
+    )
+    battery.set_soc(10)
+    return battery
+
+
+def create_prices(slot_minutes: int, seed: int = 1) -> list[float]:
+    """Two days of prices with a morning and an evening peak"""
+    rng = random.Random(seed)
+    slots_per_hour = 60 // slot_minutes
+    hourly_prices = [
+        100 + 80 * math.sin(hour / 24 * 4 * math.pi) + rng.uniform(-30, 30)
+        for hour in range(48)
+    ]
+    return [
+        round(price + rng.uniform(-5, 5), 2)
+        for price in hourly_prices
+        for _ in range(slots_per_hour)
+    ]
+
+
+def time_planner(planner: Planner, prices: list[float]) -> float:
+    """Median time (ms) to create a plan"""
+    durations = []
+    for _ in range(RUNS):
+        start = perf_counter()
+        planner.create_price_arbitrage_plan(create_battery(), prices, prices)
+        durations.append((perf_counter() - start) * 1000)
+    return median(durations)
+
+
+def time_optimal_48_hours() -> float:
+    """Median time (ms) of an optimal plan for 48 hours at 10 Wh resolution"""
+    rng = random.Random(0)
+    import_prices = [rng.uniform(0.5, 3.0) for _ in range(48)]
+    export_prices = [price - 0.2 for price in import_prices]
+    planner = OptimalPlanner(0.1, 0.05, 0, resolution=10)
+    durations = []
+    for _ in range(RUNS):
+        start = perf_counter()
+        planner.create_price_arbitrage_plan(
+            Battery(15000, 5000, 5000, 95, 5), import_prices, export_prices
+        )
+        durations.append((perf_counter() - start) * 1000)
+    return median(durations)
+
+
+class GapFillTimer(Planner):
+    """Greedy planner that measures the time of each gap filling iteration"""
+
+    durations: list[float]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.durations = []
+
+    def _find_and_fill_gaps(self, *args, **kwargs):
+        start = perf_counter()
+        super()._find_and_fill_gaps(*args, **kwargs)
+        self.durations.append((perf_counter() - start) * 1000)
+
+
+class SolarnetRecorder:
+    """Stands in for the Solarnet requests, keeps the posted time of use entries"""
+
+    payloads: list[str]
+
+    def __init__(self):
+        self.payloads = ['{"timeofuse":[]}']
+
+    async def get(self, _digest_uri: str):
+        return self
+
+    async def post_json(self, _digest_uri: str, payload: str):
+        self.payloads.append(payload)
+        return self
+
+    @property
+    def status_code(self) -> int:
+        return 200
+
+    def json(self):
+        return json.loads(self.payloads[-1])
+
+
+def one_entry_per_hour_payload(schedule: dict[datetime, int]) -> str:
+    """Payload size before merging, a MIN and a MAX entry for every hour"""
+    schedule_types = {
+        -1: ("CHARGE_MIN", "CHARGE_MAX"),
+        0: ("DISCHARGE_MIN", "DISCHARGE_MAX"),
+        1: ("DISCHARGE_MIN", "DISCHARGE_MAX"),
+    }
+    entries = []
+    for hour, power in schedule.items():
+        for schedule_type in schedule_types[(power > 0) - (power < 0)]:
+            entries.append(
+                SolarnetChargeSchedule(hour, power)
+                .set_schedule_type(schedule_type)
+                .tojsondict()
+            )
+    return json.dumps({"timeofuse": entries})
+
+
+def payload_sizes() -> list[tuple[str, int, int]]:
+    """Bytes posted to the inverter, one entry per hour versus merged entries"""
+    api = FroniusSolarnetApi({"host": "", "username": "", "password": ""}, None)
+    recorder = SolarnetRecorder()
+    api._solarnet = recorder  # pylint: disable=protected-access
+
+    midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+    stop_schedule = {
+        midnight + timedelta(days=day, hours=hour): 0
+        for day in range(7)
+        for hour in range(24)
+    }
+    asyncio.run(api.stop())
+    sizes = [
+        (
+            "stop",
+            len(one_entry_per_hour_payload(stop_schedule)),
+            len(recorder.payloads[-1]),
+        )
+    ]
+
+    recorder.payloads = ['{"timeofuse":[]}']
+    prices = create_prices(60)
+    start_hour = datetime.now().hour + 1
+    charge_plan = Planner(83).create_price_arbitrage_plan(
+        create_battery(), prices, prices, start_hour
+    )
+    asyncio.run(api.schedule_battery(charge_plan))
+    plan_schedule = {
+        charge_hour.get_time(): charge_hour.get_power()
+        for charge_hour in charge_plan.get_hours_list()
+    }
+    sizes.append(
+        (
+            "plan",
+            len(one_entry_per_hour_payload(plan_schedule)),
+            len(recorder.payloads[-1]),
+        )
+    )
+    return sizes
+
+
+async def start_mock_solarnet() -> web.AppRunner:
+    """Solarnet on localhost with digest authorization, that rejects a nonce count
+    that is not higher than the last one and a nonce used NONCE_USES times"""
+    schedules = {"timeofuse": []}
+    nonce_counts: dict[str, int] = {}
+
+    def challenge() -> web.Response:
+        nonce = f"{len(nonce_counts):016x}"
+        nonce_counts[nonce] = 0
+        return web.Response(
+            status=401,
+            headers={
+                "X-WWW-Authenticate": 'Digest realm="Webinterface area", '
+                f'nonce="{nonce}", qop="auth", algorithm="MD5"'
+            },
+        )
+
+    async def handle(request: web.Request) -> web.Response:
+        auth = request.headers.get("Authorization")
+        if auth is None:
+            return challenge()
+        nonce = parse_parameter_from_auth_data("nonce", auth)
+        nonce_count = int(parse_parameter_from_auth_data("nc", auth), 16)
+        if not nonce_counts.get(nonce, NONCE_USES) < nonce_count <= NONCE_USES:
+            return challenge()
+        nonce_counts[nonce] = nonce_count
+        if request.method == "POST":
+            schedules.update(await request.json())
+            return web.json_response({"errors": [], "writeSuccess": ["timeofuse"]})
+        return web.json_response(schedules)
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+async def time_executor_requests(host: str, loop) -> tuple[float, int, float]:
+    """Median latency (ms), executor jobs and round trips per request of
+    requests.get in the executor, a new connection for every request and the
+    nonce count always 1"""
+    executor_jobs = 0
+
+    async def get(uri: str, auth_data: dict[str, str]) -> requests.Response:
+        nonlocal executor_jobs
+        headers = {}
+        if auth_data:
+            headers = {
+                "Authorization": create_auth_header(GET, auth_data, uri, "u", "p")
+            }
+        executor_jobs += 1
+        return await loop.run_in_executor(
+            None, lambda: requests.get(f"{host}{uri}", headers=headers, timeout=30)
+        )
+
+    auth_data = parse_auth_data_from_response(await get(TIMEOFUSE_URI, {}))
+    executor_jobs = 0
+    durations = []
+    for _ in range(HTTP_REQUESTS):
+        start = perf_counter()
+        response = await get(TIMEOFUSE_URI, auth_data)
+        if response.status_code == 401:
+            auth_data = parse_auth_data_from_response(response)
+            response = await get(TIMEOFUSE_URI, auth_data)
+        response.raise_for_status()
+        durations.append((perf_counter() - start) * 1000)
+    return median(durations), executor_jobs, executor_jobs / HTTP_REQUESTS
+
+
+async def time_session_requests(host: str) -> tuple[float, int, float]:
+    """Median latency (ms), executor jobs and round trips per request of
+    DigestAuthRequest"""
+    solarnet = DigestAuthRequest(host, "u", "p")
+    await solarnet.get(TIMEOFUSE_URI)
+    round_trips = solarnet.get_statistics()["round_trips"]
+    durations = []
+    for _ in range(HTTP_REQUESTS):
+        start = perf_counter()
+        await solarnet.get(TIMEOFUSE_URI)
+        durations.append((perf_counter() - start) * 1000)
+    round_trips = solarnet.get_statistics()["round_trips"] - round_trips
+    await solarnet.close()
+    return median(durations), 0, round_trips / HTTP_REQUESTS
+
+
+async def logins_per_reschedule(host: str) -> float:
+    """Logins for pushing a plan and reading back the active plan"""
+    api = FroniusSolarnetApi(
+        {"host": host.removeprefix("http://"), "username": "u", "password": "p"},
+        None,
+    )
+    prices = create_prices(60)
+    charge_plan = Planner(83).create_price_arbitrage_plan(
+        create_battery(), prices, prices, datetime.now().hour + 1
+    )
+    reschedules = 10
+    for _ in range(reschedules):
+        await api.schedule_battery(charge_plan)
+        await api.get_active_charge_plan()
+    await api.close()
+    return api.get_statistics()["logins"] / reschedules
+
+
+async def http_latencies() -> tuple[list[tuple[str, float, int, float]], float]:
+    """Latency of GET requests to a mock Solarnet, executor versus shared session,
+    and the logins per reschedule"""
+    runner = await start_mock_solarnet()
+    port = runner.addresses[0][1]
+    host = f"http://127.0.0.1:{port}"
+    try:
+        return [
+            (
+                "executor",
+                *await time_executor_requests(host, asyncio.get_running_loop()),
+            ),
+            ("session", *await time_session_requests(host)),
+        ], await logins_per_reschedule(host)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    print(f"{'engine':<10}{'slots':>8}{'ms':>10}")
+    for slot_minutes in (60, 15):
+        prices = create_prices(slot_minutes)
+        for name, planner in (
+            ("greedy", Planner(83, slot_minutes=slot_minutes)),
+            ("optimal", OptimalPlanner(83, slot_minutes=slot_minutes)),
+            ("trade", TradePlanner(83, slot_minutes=slot_minutes)),
+        ):
+            duration = time_planner(planner, prices)
+            print(f"{name:<10}{len(prices):>8}{duration:>10.2f}")
+
+    duration = time_optimal_48_hours()
+    print(
+        f"optimal 15 kWh at 10 Wh: {duration:.2f} ms "
+        f"({'within' if duration < OPTIMAL_BUDGET_MS else 'over'} "
+        f"the {OPTIMAL_BUDGET_MS} ms budget)"
+    )
+
+    print(f"\n{'gap fill':<10}{'slots':>8}{'ms/iter':>10}")
+    for slot_minutes in (60, 15, 5):
+        prices = create_prices(slot_minutes)
+        planner = GapFillTimer(83, slot_minutes=slot_minutes)
+        time_planner(planner, prices)
+        duration = median(planner.durations)
+        print(f"{'greedy':<10}{len(prices):>8}{duration:>10.3f}")
+
+    print(f"\n{'payload':<10}{'per hour':>10}{'merged':>10}")
+    for name, per_hour_bytes, merged_bytes in payload_sizes():
+        print(f"{name:<10}{per_hour_bytes:>10}{merged_bytes:>10}")
+
+    print(f"\n{'http':<10}{'ms':>10}{'executor':>10}{'trips':>10}")
+    latencies, logins = asyncio.run(http_latencies())
+    for name, latency, executor_jobs, round_trips in latencies:
+        print(f"{name:<10}{latency:>10.3f}{executor_jobs:>10}{round_trips:>10.2f}")
+    print(f"logins per reschedule: {logins:.2f}")
+
+
+if __name__ == "__main__":
+    main()
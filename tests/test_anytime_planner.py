@@ -0,0 +1,100 @@
+"""AnytimePlanner tests module"""
+
+import pytest
+
+from custom_components.battery_planner.anytime_planner import AnytimePlanner
+from custom_components.battery_planner.optimal_planner import OptimalPlanner
+from custom_components.battery_planner.planner import PlanningCancelled, _is_feasible
+from custom_components.battery_planner.battery import Battery
+from .fixtures import *
+from .test_data import *
+
+
+class TestAnytimePlanner:
+    def test_greedy_plan_without_time_budget(
+        self, planner: Planner, battery_one_kw_one_kwh: Battery
+    ):
+        data = long_price_series_start_on_hour_21
+        anytime_planner = AnytimePlanner(time_budget=0)
+        charge_plan = anytime_planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        greedy_plan = planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        assert charge_plan.expected_yield() == greedy_plan.expected_yield()
+        statistics = anytime_planner.get_statistics()
+        assert statistics["refinements"] == 0
+        assert statistics["refinements_out_of_time"] == 1
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            long_price_series_with_3_cycles,
+            long_price_series_start_on_hour_21,
+        ],
+    )
+    def test_refined_plan_within_time_budget(
+        self, battery_one_kw_one_kwh: Battery, data
+    ):
+        anytime_planner = AnytimePlanner(time_budget=60)
+        charge_plan = anytime_planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        optimal_plan = OptimalPlanner().create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        assert charge_plan.expected_yield() == pytest.approx(
+            optimal_plan.expected_yield()
+        )
+        assert anytime_planner.get_statistics()["refinements"] == 4
+
+    def test_infeasible_plan_with_higher_yield_is_not_used(self):
+        battery = Battery(2000, 1000, 1000, 100, 0)
+        battery.set_soc(50)
+        battery.set_average_charge_cost(1.0)
+        prices = [1.7, 2.1, 1.6, 0.5, 1.2, 0.4, 2.0, 1.2]
+        greedy_plan = Planner().create_price_arbitrage_plan(
+            battery.clone(), prices, prices
+        )
+        optimal_plan = OptimalPlanner().create_price_arbitrage_plan(
+            battery.clone(), prices, prices
+        )
+        assert not _is_feasible(greedy_plan, battery)
+        assert greedy_plan.expected_yield() > optimal_plan.expected_yield()
+
+        charge_plan = AnytimePlanner(time_budget=60).create_price_arbitrage_plan(
+            battery.clone(), prices, prices
+        )
+        assert _is_feasible(charge_plan, battery)
+        assert charge_plan.expected_yield() >= optimal_plan.expected_yield()
+
+    def test_refinements_are_cancelled(self, battery_one_kw_one_kwh: Battery):
+        data = long_price_series_with_3_cycles
+        anytime_planner = AnytimePlanner(time_budget=60)
+        anytime_planner.set_cancel_check(lambda: True)
+        for refinement in anytime_planner._refinements:
+            with pytest.raises(PlanningCancelled):
+                refinement.create_price_arbitrage_plan(
+                    battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+                )
+
+    def test_optimal_refinement_when_battery_is_partly_charged(
+        self, battery_one_kw_two_kwh: Battery
+    ):
+        data = long_price_series_with_3_cycles
+        # Not a multiple of the energy resolution of any refinement
+        battery_one_kw_two_kwh.set_energy(1234)
+        battery_one_kw_two_kwh.set_average_charge_cost(1.0)
+        anytime_planner = AnytimePlanner(time_budget=60)
+        charge_plan = anytime_planner.create_price_arbitrage_plan(
+            battery_one_kw_two_kwh.clone(), data["import"], data["export"]
+        )
+        optimal_plan = OptimalPlanner().create_price_arbitrage_plan(
+            battery_one_kw_two_kwh.clone(), data["import"], data["export"]
+        )
+        assert _is_feasible(optimal_plan, battery_one_kw_two_kwh)
+        assert charge_plan.expected_yield() == pytest.approx(
+            optimal_plan.expected_yield()
+        )
+        assert anytime_planner.get_statistics()["refined_plans"] == 1
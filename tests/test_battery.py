@@ -1,5 +1,6 @@
 from custom_components.battery_planner.battery import Battery
 from custom_components.battery_planner.charge_hour import ChargeHour
+from custom_components.battery_planner.time_base import TimeBase
 from .fixtures import *
 
 
@@ -39,3 +40,13 @@ class TestBattery:
             ChargeHour(hour=1, import_price=5, export_price=4, power=0)
         )
         assert battery_one_kw_one_kwh.discharge_max_power_for_one_hour() == 1000
+
+    def test_charge_and_discharge_quarter_hour(self, battery_one_kw_one_kwh: Battery):
+        """Test that a 15 minute slot only moves a quarter of the hourly energy"""
+        quarter_hour = ChargeHour(0, 2, 1, 0, TimeBase(datetime.now(), 15))
+        assert battery_one_kw_one_kwh.charge_max_power_for_one_hour(quarter_hour) == (
+            -1000
+        )
+        assert battery_one_kw_one_kwh.get_energy() == 250
+        assert battery_one_kw_one_kwh.discharge_max_power_for_one_hour(0.25) == 1000
+        assert battery_one_kw_one_kwh.get_energy() == 0
@@ -0,0 +1,346 @@
+"""BatteryPlanner tests module"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from custom_components.battery_planner import battery_planner as battery_planner_module
+from custom_components.battery_planner.battery import Battery
+from custom_components.battery_planner.battery_planner import BatteryPlanner
+from custom_components.battery_planner.charge_plan import ChargePlan
+from custom_components.battery_planner.const import VERIFY_DELAY
+from .fixtures import *
+
+PRICES = [1.0, 5.0] * 24
+
+
+class FakeHass:
+    """The parts of HomeAssistant that BatteryPlanner uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.loop = asyncio.get_running_loop()
+        self.tasks = []
+
+    def async_create_task(self, target, name=None):
+        task = self.loop.create_task(target)
+        self.tasks.append(task)
+        return task
+
+    async def async_block_till_done(self):
+        while not all(task.done() for task in self.tasks):
+            await asyncio.gather(*self.tasks)
+
+
+class FakeBatteryApi:
+    """Battery that runs the last pushed plan, reading it fails while failure is
+    set to an exception to raise or to a result that is not a plan"""
+
+    def __init__(self):
+        self.pushed_plans = []
+        self.reads = 0
+        self.failure = None
+        self.active_charge_plan = ChargePlan()
+        self.closed = False
+
+    def set_slot_minutes(self, slot_minutes: int) -> None:
+        pass
+
+    def get_statistics(self) -> dict[str, int]:
+        return {}
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def schedule_battery(self, new_charge_plan: ChargePlan) -> bool:
+        self.pushed_plans.append(new_charge_plan)
+        self.active_charge_plan = new_charge_plan.clone()
+        return True
+
+    async def clear(self) -> bool:
+        self.active_charge_plan = ChargePlan()
+        return True
+
+    async def get_active_charge_plan(self) -> ChargePlan:
+        self.reads += 1
+        await asyncio.sleep(0)
+        if isinstance(self.failure, Exception):
+            raise self.failure
+        if self.failure is not None:
+            return self.failure
+        return self.active_charge_plan.clone()
+
+
+class FakeTimers:
+    """Timers of async_call_later, that are run by the test"""
+
+    def __init__(self):
+        self.timers = []
+
+    def async_call_later(self, hass, delay, action):
+        timer = {"delay": delay, "action": action, "cancelled": False}
+        self.timers.append(timer)
+
+        def cancel():
+            timer["cancelled"] = True
+
+        return cancel
+
+    async def run_pending(self) -> None:
+        timers, self.timers = self.timers, []
+        for timer in timers:
+            if not timer["cancelled"]:
+                await timer["action"](datetime.now())
+
+
+@pytest.fixture
+def battery_api(monkeypatch) -> FakeBatteryApi:
+    api = FakeBatteryApi()
+    monkeypatch.setattr(
+        battery_planner_module,
+        "create_api_instance_from_secrets_file",
+        lambda hass: api,
+    )
+    return api
+
+
+@pytest.fixture
+def timers(monkeypatch) -> FakeTimers:
+    fake_timers = FakeTimers()
+    monkeypatch.setattr(
+        battery_planner_module, "async_call_later", fake_timers.async_call_later
+    )
+    return fake_timers
+
+
+def run(test, battery: Battery, **kwargs):
+    """Run the async test with a BatteryPlanner using a FakeHass"""
+
+    async def run_test():
+        hass = FakeHass()
+        battery_planner = BatteryPlanner(hass, battery, **kwargs)
+        try:
+            await test(hass, battery_planner)
+            await hass.async_block_till_done()
+        finally:
+            await battery_planner.shutdown()
+
+    asyncio.run(run_test())
+
+
+class TestBatteryPlanner:
+    def test_reschedule_requests_within_window_are_merged(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            for battery_state_of_charge in (10, 50, 90):
+                await battery_planner.request_reschedule(
+                    battery_state_of_charge, PRICES, PRICES, 0, 0, 0
+                )
+            assert len(timers.timers) == 1
+            assert timers.timers[0]["delay"] == 5
+            assert battery_api.pushed_plans == []
+
+            await timers.run_pending()
+            await hass.async_block_till_done()
+            assert len(battery_api.pushed_plans) == 1
+            assert battery_api.pushed_plans[0].get_initial_energy() == 2700
+            assert battery_planner.get_statistics()["reschedule"] == {
+                "requests": 3,
+                "merged": 2,
+            }
+
+        run(test, battery_two_kw_three_kwh, reschedule_window=5)
+
+    def test_zero_power_plan_is_pushed_after_clear(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.clear()
+            flat_prices = [1.0] * 48
+            await battery_planner.reschedule(0, flat_prices, flat_prices, 0, 0, 0)
+            await hass.async_block_till_done()
+            assert len(battery_api.pushed_plans) == 1
+            assert battery_api.pushed_plans[0].is_empty_plan()
+            assert battery_planner.get_statistics()["push"]["skipped_unchanged"] == 0
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_unchanged_plan_is_not_pushed_again(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            for _ in range(2):
+                await battery_planner.reschedule(0, PRICES, PRICES, 0, 0, 0)
+                await hass.async_block_till_done()
+            assert len(battery_api.pushed_plans) == 1
+
+            changed_prices = [1.0, 5.0, 5.0, 1.0] * 12
+            await battery_planner.reschedule(0, changed_prices, changed_prices, 0, 0, 0)
+            await hass.async_block_till_done()
+            assert len(battery_api.pushed_plans) == 2
+            assert battery_planner.get_statistics()["push"] == {
+                "pushed": 2,
+                "skipped_unchanged": 1,
+                "skipped_small_improvement": 0,
+            }
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_api_is_closed_on_shutdown(
+        self, battery_api: FakeBatteryApi, battery_two_kw_three_kwh: Battery
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.get_active_charge_plan()
+            assert not battery_api.closed
+
+        run(test, battery_two_kw_three_kwh)
+        assert battery_api.closed
+
+    def test_concurrent_refreshes_read_the_active_plan_once(
+        self, battery_api: FakeBatteryApi, battery_two_kw_three_kwh: Battery
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            active_charge_plans = await asyncio.gather(
+                *(
+                    battery_planner.get_active_charge_plan(refresh=True)
+                    for _ in range(5)
+                )
+            )
+            assert battery_api.reads == 1
+            assert all(plan is active_charge_plans[0] for plan in active_charge_plans)
+
+            # Within the TTL the fetched plan is reused
+            await battery_planner.refresh()
+            assert battery_api.reads == 1
+
+            # Clearing the battery makes the fetched plan outdated
+            await battery_planner.clear()
+            assert battery_api.reads == 2
+            assert battery_planner.get_statistics()["active_plan"] == {
+                "fetched": 2,
+                "joined": 4,
+                "cached": 1,
+                "verified": 0,
+                "mismatched": 0,
+                "unverified": 0,
+            }
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_pushed_plan_is_verified_after_the_delay(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.reschedule(0, PRICES, PRICES, 0, 0, 0)
+            await hass.async_block_till_done()
+            assert battery_api.reads == 0
+            assert [timer["delay"] for timer in timers.timers] == [VERIFY_DELAY]
+
+            await timers.run_pending()
+            assert battery_api.reads == 1
+            assert battery_planner.get_statistics()["active_plan"]["verified"] == 1
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_mismatch_found_by_verification_replaces_the_expected_plan(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.reschedule(0, PRICES, PRICES, 0, 0, 0)
+            await hass.async_block_till_done()
+            pushed_plan = battery_api.pushed_plans[0]
+            expected_plan = await battery_planner.get_active_charge_plan()
+            assert expected_plan.get_hours_list()[0].get_power() != 0
+
+            # The battery did not take the first hour of the plan
+            battery_api.active_charge_plan.get_hours_list()[0].set_power(0)
+            await timers.run_pending()
+
+            active_plan = await battery_planner.get_active_charge_plan()
+            assert active_plan is not expected_plan
+            assert active_plan.get_hours_list()[0].get_power() == 0
+            start = pushed_plan.get_first().get_time()
+            end = start + timedelta(days=2)
+            assert active_plan.power_fingerprint(start, end) == (
+                battery_api.active_charge_plan.power_fingerprint(start, end)
+            )
+            statistics = battery_planner.get_statistics()["active_plan"]
+            assert statistics["verified"] == 0
+            assert statistics["mismatched"] == 1
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_verification_is_cancelled_when_the_battery_is_cleared(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.reschedule(0, PRICES, PRICES, 0, 0, 0)
+            await hass.async_block_till_done()
+            await battery_planner.clear()
+            assert [timer["cancelled"] for timer in timers.timers] == [True]
+            assert battery_api.reads == 1
+
+        run(test, battery_two_kw_three_kwh)
+
+    @pytest.mark.parametrize("failure", [ConnectionError("No route to host"), False])
+    def test_plan_is_not_verified_when_it_cannot_be_read_back(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+        failure,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            await battery_planner.reschedule(0, PRICES, PRICES, 0, 0, 0)
+            await hass.async_block_till_done()
+            expected_plan = await battery_planner.get_active_charge_plan()
+
+            battery_api.failure = failure
+            await timers.run_pending()
+            assert battery_api.reads == 1
+            assert await battery_planner.get_active_charge_plan() is expected_plan
+            statistics = battery_planner.get_statistics()["active_plan"]
+            assert statistics["verified"] == 0
+            assert statistics["mismatched"] == 0
+            assert statistics["unverified"] == 1
+
+        run(test, battery_two_kw_three_kwh)
+
+    def test_full_plan_is_not_reused_for_incremental_reschedule(
+        self,
+        battery_api: FakeBatteryApi,
+        timers: FakeTimers,
+        battery_two_kw_three_kwh: Battery,
+    ):
+        async def test(hass: FakeHass, battery_planner: BatteryPlanner):
+            for incremental in (False, True, True):
+                await battery_planner.reschedule(
+                    0, PRICES, PRICES, 0, 0, 0, incremental=incremental
+                )
+            await hass.async_block_till_done()
+            statistics = battery_planner.get_statistics()
+            assert statistics["plan_cache"]["misses"] == 2
+            assert statistics["plan_cache"]["hits"] == 1
+            assert statistics["incremental"]["repaired"] == 1
+
+        run(test, battery_two_kw_three_kwh)
@@ -1,11 +1,13 @@
 """ChargePlan tests module"""
 
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 
 import pytest
 
 from custom_components.battery_planner.charge_plan import ChargePlan
 from custom_components.battery_planner.charge_hour import ChargeHour
+from custom_components.battery_planner.planner import create_empty_plan
+from custom_components.battery_planner.time_base import TimeBase
 from .fixtures import *
 from .test_data import *
 
@@ -25,3 +27,147 @@ class TestChargePlan:
                 ChargeHour(i, data["import"][i], data["export"][i], power)
             )
         assert charge_plan.expected_yield() == data["yield"]
+
+    def test_expected_yield_follows_power_changes(self):
+        charge_plan = ChargePlan()
+        for i in range(3):
+            charge_plan.add_charge_hour(ChargeHour(i, 1.0 + i, 0.5 + i, 0))
+        charge_plan.get_by_index(0).set_power(-1000)
+        charge_plan.get_by_index(2).set_power(1000)
+        assert charge_plan.expected_yield() == -1.0 + 2.5
+        charge_plan.get_by_index(2).set_export_price(4.0)
+        assert charge_plan.expected_yield() == -1.0 + 4.0
+
+    def test_changed_hours_are_tracked_until_cleared(self):
+        charge_plan = ChargePlan()
+        for i in range(3):
+            charge_plan.add_charge_hour(ChargeHour(i, 1.0, 1.0, 0))
+        assert not charge_plan.has_changed_hours()
+        charge_plan.get_by_index(1).set_power(-1000)
+        charge_plan.get_by_index(2).set_power(0)
+        assert charge_plan.get_changed_hours() == {1}
+        charge_plan.clear_changed_hours()
+        assert not charge_plan.has_changed_hours()
+
+    def test_hours_added_out_of_order_are_sorted_by_time(self):
+        charge_plan = ChargePlan()
+        for i in [3, 0, 2, 1]:
+            charge_plan.add_charge_hour(ChargeHour(i, 1.0, 1.0, -i))
+        assert [hour.get_index() for hour in charge_plan.get_hours_list()] == [
+            0,
+            1,
+            2,
+            3,
+        ]
+        assert charge_plan.index_of(charge_plan.get_last()) == 3
+        assert charge_plan.get_next_after(charge_plan.get_by_index(1)).get_index() == 2
+        assert charge_plan.get_first().get_index() == 0
+
+    def test_add_replaces_hour_at_same_time(self):
+        charge_plan = ChargePlan()
+        charge_plan.add_charge_hour(ChargeHour(0, 1.0, 1.0, -1000))
+        charge_plan.add_charge_hour(ChargeHour(0, 1.0, 1.0, 1000))
+        assert charge_plan.len() == 1
+        assert charge_plan.expected_yield() == 1.0
+
+    def test_pop_keeps_index_lookup(self):
+        charge_plan = ChargePlan()
+        for i in range(4):
+            charge_plan.add_charge_hour(ChargeHour(i, 1.0, 1.0, 0))
+        assert charge_plan.pop(1).get_index() == 1
+        assert charge_plan.index_of(charge_plan.get_by_index(2)) == 2
+        assert [
+            hour.get_index()
+            for hour in charge_plan.get_between(
+                charge_plan.get_first(), charge_plan.get_last()
+            )
+        ] == [2]
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            short_price_series_with_3_cycles,
+            short_price_series_with_consecutive_charge_battery_two_kw_three_kwh,
+        ],
+    )
+    def test_columns_match_hours(self, data):
+        charge_plan = ChargePlan()
+        for i, power in enumerate(data["powers"]):
+            charge_plan.add_charge_hour(
+                ChargeHour(i, data["import"][i], data["export"][i], power)
+            )
+        columns = charge_plan.columns()
+        assert columns.powers().tolist() == data["powers"]
+        assert columns.import_prices().tolist() == data["import"]
+        assert columns.expected_yield() == data["yield"]
+        first_charging_hour = charge_plan.get_first_charging_hour()
+        assert first_charging_hour.get_power() < 0
+        assert all(
+            hour.get_power() >= 0
+            for hour in charge_plan.get_hours_list()[
+                : charge_plan.index_of(first_charging_hour)
+            ]
+        )
+
+    def test_columns_follow_power_changes_and_inserts(self):
+        charge_plan = ChargePlan()
+        for i in [0, 2]:
+            charge_plan.add_charge_hour(ChargeHour(i, 1.0, 0.5, 0))
+        charge_plan.add_charge_hour(ChargeHour(1, 2.0, 1.5, 0))
+        charge_plan.get_by_index(0).set_power(-1000)
+        charge_plan.get_by_index(2).set_power(1000)
+        columns = charge_plan.columns()
+        assert columns.powers().tolist() == [-1000, 0, 1000]
+        assert columns.import_prices().tolist() == [1.0, 2.0, 1.0]
+        assert columns.average_charging_price() == 1.0
+        assert columns.energy_trajectory(500).tolist() == [1500, 1500, 500]
+        assert not charge_plan.is_empty_plan()
+
+    def test_columns_are_read_only(self):
+        charge_plan = ChargePlan()
+        charge_plan.add_charge_hour(ChargeHour(0, 1.0, 0.5, 0))
+        with pytest.raises(ValueError):
+            charge_plan.columns().powers()[0] = 1000
+
+    def test_hours_from_another_time_base_are_converted(self):
+        today = TimeBase(datetime.now())
+        yesterday = TimeBase(datetime.now() - timedelta(days=1))
+        charge_plan = ChargePlan(today)
+        charge_plan.add_charge_hour(ChargeHour(30, 1.0, 1.0, 0, yesterday))
+        charge_hour = charge_plan.get_first()
+        assert charge_hour.get_index() == 6
+        assert charge_hour.get_time_base() is today
+        assert charge_hour.get_time() == today.get_epoch() + timedelta(hours=6)
+        assert charge_plan.is_scheduled(charge_hour.get_time())
+
+    def test_hours_are_found_by_datetime_and_iso_string(self):
+        charge_plan = create_empty_plan(20)
+        charge_hour = charge_plan.get_by_index(10)
+        assert charge_hour.get_index() == 30
+        assert charge_plan.get_by_dt(
+            charge_hour.get_time() + timedelta(minutes=15)
+        ) is (charge_hour)
+        assert charge_plan.get(charge_hour.hour_iso_string()) is charge_hour
+        assert charge_plan.index_of(charge_hour.clone(TimeBase(datetime.now()))) == 10
+        assert list(charge_plan.get_hours_dict())[10] == charge_hour.hour_iso_string()
+
+    def test_power_fingerprint_ignores_hours_without_power(self):
+        time_base = TimeBase(datetime.now())
+        charge_plan = create_empty_plan(0, [1.0] * 4, [1.0] * 4, time_base)
+        charge_plan.get_by_index(1).set_power(-1000)
+        charge_plan.get_by_index(3).set_power(1000)
+
+        fetched_plan = ChargePlan(time_base)
+        for hour, power in [(1, -1000), (3, 1000), (30, 500)]:
+            fetched_plan.add_charge_hour(ChargeHour(hour, 0.0, 0.0, power, time_base))
+
+        start = time_base.time_of(0)
+        end = time_base.time_of(4)
+        assert charge_plan.power_fingerprint(start, end) == (
+            fetched_plan.power_fingerprint(start, end)
+        )
+        assert charge_plan.power_fingerprint() != fetched_plan.power_fingerprint()
+        charge_plan.get_by_index(3).set_power(900)
+        assert charge_plan.power_fingerprint(start, end) != (
+            fetched_plan.power_fingerprint(start, end)
+        )
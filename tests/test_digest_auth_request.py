@@ -0,0 +1,217 @@
+"""DigestAuthRequest tests module"""
+
+import asyncio
+import hashlib
+import json
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from custom_components.battery_planner.api.fronius_solarnet_api import (
+    digest_auth_request,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.digest_auth_request import (
+    DigestAuthRequest,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.fronius_solarnet_api import (
+    FroniusSolarnetApi,
+)
+
+HOST = "http://127.0.0.1"
+
+
+class StubClientResponse:
+    """The parts of aiohttp.ClientResponse that DigestAuthRequest uses"""
+
+    def __init__(self, status: int, headers: dict[str, str], content: bytes):
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._content = content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def read(self) -> bytes:
+        return self._content
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+
+class StubSession:
+    """Stands in for aiohttp.ClientSession, challenges requests that are not
+    authorized with the current nonce"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.nonce = "7f3a9c01"
+        self.requests = []
+        self.closed = False
+
+    def request(self, method: str, url: str, headers: dict, data=None):
+        assert not self.closed
+        self.requests.append((method, url, dict(headers)))
+        authorization = headers.get("Authorization", "")
+        if f"nonce={self.nonce}," not in authorization:
+            challenge = (
+                f'Digest realm="Webinterface area", nonce="{self.nonce}", '
+                f'qop="auth", algorithm="MD5"'
+            )
+            if authorization:
+                challenge += ", stale=true"
+            return StubClientResponse(401, {"X-WWW-Authenticate": challenge}, b"")
+        return StubClientResponse(200, {}, json.dumps({"timeofuse": []}).encode())
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def sessions(monkeypatch) -> list[StubSession]:
+    """The sessions created by DigestAuthRequest"""
+    created_sessions = []
+
+    def create_session(**kwargs) -> StubSession:
+        session = StubSession(**kwargs)
+        created_sessions.append(session)
+        return session
+
+    monkeypatch.setattr(aiohttp, "ClientSession", create_session)
+    monkeypatch.setattr(aiohttp, "TCPConnector", lambda **kwargs: kwargs)
+    return created_sessions
+
+
+def authorization(request: tuple) -> dict[str, str]:
+    """Parameters of the Authorization header of a request made on a StubSession"""
+    header = request[2]["Authorization"].removeprefix("Digest ")
+    return dict(parameter.split("=", 1) for parameter in header.split(", "))
+
+
+def expected_response(parameters: dict[str, str], password: str) -> str:
+    """Digest that the server expects for the parameters of a GET request"""
+    ha1 = hashlib.md5(
+        f"{parameters['username']}:{parameters['realm']}:{password}".encode()
+    ).hexdigest()
+    ha2 = hashlib.md5(f"GET:{parameters['uri']}".encode()).hexdigest()
+    return hashlib.md5(
+        f"{ha1}:{parameters['nonce']}:{parameters['nc']}:{parameters['cnonce']}:"
+        f"{parameters['qop']}:{ha2}".encode()
+    ).hexdigest()
+
+
+class TestDigestAuthRequest:
+    def test_session_is_reused_until_closed(self, sessions: list[StubSession]):
+        async def test():
+            request = DigestAuthRequest(HOST, "user", "password", pool_size=3)
+            for _ in range(3):
+                response = await request.get("/config/timeofuse")
+                assert response.status_code == 200
+            assert len(sessions) == 1
+            assert sessions[0].kwargs["connector"] == {"limit_per_host": 3}
+            # Only the first request is challenged
+            assert len(sessions[0].requests) == 4
+
+            await request.close()
+            assert sessions[0].closed
+
+            await request.get("/config/timeofuse")
+            assert len(sessions) == 2
+            await request.close()
+            assert sessions[1].closed
+
+        asyncio.run(test())
+
+    def test_session_is_closed_with_the_api(self, sessions: list[StubSession]):
+        async def test():
+            fronius_api = FroniusSolarnetApi(
+                {"host": "127.0.0.1", "username": "user", "password": "password"},
+                None,
+            )
+            await fronius_api.get_active_charge_plan()
+            await fronius_api.clear()
+            assert len(sessions) == 1
+            assert [request[1] for request in sessions[0].requests] == [
+                f"{HOST}/commands/Login?user=user",
+                f"{HOST}/commands/Login?user=user",
+                f"{HOST}/config/timeofuse",
+                f"{HOST}/config/timeofuse",
+            ]
+
+            await fronius_api.close()
+            assert sessions[0].closed
+
+        asyncio.run(test())
+
+    def test_nonce_count_increases_with_each_request(self, sessions: list[StubSession]):
+        async def test():
+            request = DigestAuthRequest(HOST, "user", "password")
+            for _ in range(3):
+                await request.get("/config/timeofuse")
+            await request.close()
+
+        asyncio.run(test())
+        requests = sessions[0].requests
+        assert "Authorization" not in requests[0][2]
+        parameters = [authorization(request) for request in requests[1:]]
+        assert [p["nc"] for p in parameters] == ["00000001", "00000002", "00000003"]
+        assert {p["nonce"] for p in parameters} == {"7f3a9c01"}
+        assert len({p["cnonce"] for p in parameters}) == 3
+        for p in parameters:
+            assert p["response"] == expected_response(p, "password")
+
+    def test_ha1_is_computed_once_per_realm(
+        self, sessions: list[StubSession], monkeypatch
+    ):
+        realms = []
+
+        def create_ha1(algorithm, username, realm, password):
+            realms.append(realm)
+            return hashlib.md5(f"{username}:{realm}:{password}".encode()).hexdigest()
+
+        monkeypatch.setattr(digest_auth_request, "create_ha1", create_ha1)
+
+        async def test():
+            request = DigestAuthRequest(HOST, "user", "password")
+            for _ in range(3):
+                await request.get("/config/timeofuse")
+            sessions[0].nonce = "9b2e4d07"
+            await request.get("/config/timeofuse")
+            await request.close()
+
+        asyncio.run(test())
+        assert realms == ["Webinterface area"]
+        for request in sessions[0].requests[1:]:
+            parameters = authorization(request)
+            assert parameters["response"] == expected_response(parameters, "password")
+
+    def test_stale_nonce_is_replaced_by_the_new_one(self, sessions: list[StubSession]):
+        async def test():
+            request = DigestAuthRequest(HOST, "user", "password")
+            for _ in range(2):
+                await request.get("/config/timeofuse")
+            sessions[0].nonce = "9b2e4d07"
+            for _ in range(2):
+                response = await request.get("/config/timeofuse")
+                assert response.status_code == 200
+            await request.close()
+            return request.get_statistics()
+
+        statistics = asyncio.run(test())
+        parameters = [authorization(request) for request in sessions[0].requests[1:]]
+        assert [(p["nonce"], p["nc"]) for p in parameters] == [
+            ("7f3a9c01", "00000001"),
+            ("7f3a9c01", "00000002"),
+            # Rejected with stale=true
+            ("7f3a9c01", "00000003"),
+            ("9b2e4d07", "00000001"),
+            ("9b2e4d07", "00000002"),
+        ]
+        assert statistics["requests"] == 4
+        assert statistics["round_trips"] == 6
+        assert statistics["challenges"] == 2
+        assert statistics["stale_nonces"] == 1
@@ -0,0 +1,281 @@
+"""FroniusSolarnetApi tests module"""
+
+import asyncio
+import json
+from datetime import date, datetime, time, timedelta
+
+import aiohttp
+import pytest
+
+from custom_components.battery_planner.api.fronius_solarnet_api import (
+    fronius_solarnet_api as fronius_solarnet_api_module,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.fronius_solarnet_api import (
+    FroniusSolarnetApi,
+    _merge_weekdays,
+    _powers_by_schedule_type,
+)
+from custom_components.battery_planner.api.fronius_solarnet_api.solarnet_charge_schedule import (
+    SolarnetChargeSchedule,
+)
+from custom_components.battery_planner.planner import create_empty_plan
+from custom_components.battery_planner.time_base import TimeBase
+
+
+class StubResponse:
+    """Response of StubSolarnet"""
+
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class StubSolarnet:
+    """Stands in for DigestAuthRequest, keeps the posted time of use entries
+    and rejects the given number of time of use requests with the status"""
+
+    def __init__(self):
+        self.timeofuse = []
+        self.requests = []
+        self.rejections = 0
+        self.rejection_status = 401
+
+    def _reject(self, digest_uri: str) -> None:
+        if self.rejections > 0 and not digest_uri.startswith("/commands/Login"):
+            self.rejections -= 1
+            raise aiohttp.ClientResponseError(None, (), status=self.rejection_status)
+
+    async def get(self, digest_uri: str) -> StubResponse:
+        self.requests.append(("GET", digest_uri))
+        self._reject(digest_uri)
+        return StubResponse({"timeofuse": self.timeofuse})
+
+    async def post_json(self, digest_uri: str, payload: str) -> StubResponse:
+        self.requests.append(("POST", digest_uri))
+        self._reject(digest_uri)
+        self.timeofuse = json.loads(payload)["timeofuse"]
+        return StubResponse({"errors": []})
+
+    def get_statistics(self) -> dict[str, int]:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def solarnet() -> StubSolarnet:
+    return StubSolarnet()
+
+
+@pytest.fixture
+def fronius_api(solarnet: StubSolarnet) -> FroniusSolarnetApi:
+    api = FroniusSolarnetApi({"host": "127.0.0.1", "username": "user"}, None)
+    api._solarnet = solarnet
+    return api
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """Monotonic time used for the login session, set by the test"""
+    now = [1000.0]
+    monkeypatch.setattr(fronius_solarnet_api_module, "monotonic", lambda: now[0])
+    return now
+
+
+LOGIN = ("GET", "/commands/Login?user=user")
+GET_TIMEOFUSE = ("GET", "/config/timeofuse")
+POST_TIMEOFUSE = ("POST", "/config/timeofuse")
+
+
+def tomorrow_plan(powers: list[int]):
+    """Plan starting at midnight tomorrow with the given power for each hour"""
+    charge_plan = create_empty_plan(
+        24, [1.0] * (24 + len(powers)), [1.0] * (24 + len(powers)), TimeBase.today()
+    )
+    for charge_hour, power in zip(charge_plan.get_hours_list(), powers):
+        charge_hour.set_power(power)
+    return charge_plan
+
+
+def entries(solarnet_schedules: list[SolarnetChargeSchedule]) -> list[tuple]:
+    """Sorted type, time table, power and weekdays of each schedule"""
+    return sorted(
+        (
+            solarnet_schedule.get_schedule_type(),
+            solarnet_schedule.tojsondict()["TimeTable"]["Start"],
+            solarnet_schedule.tojsondict()["TimeTable"]["End"],
+            solarnet_schedule.get_power(),
+            tuple(sorted(solarnet_schedule.get_weekday_indexes())),
+        )
+        for solarnet_schedule in solarnet_schedules
+    )
+
+
+class TestFroniusSolarnetApi:
+    def test_unchanged_schedule_is_not_posted(
+        self, fronius_api: FroniusSolarnetApi, solarnet: StubSolarnet
+    ):
+        charge_plan = tomorrow_plan([-2000, -2000, 0, 3000])
+        assert asyncio.run(fronius_api.schedule_battery(charge_plan))
+        assert asyncio.run(fronius_api.schedule_battery(charge_plan))
+        statistics = fronius_api.get_statistics()
+        assert statistics["posts"] == 1
+        assert statistics["posts_skipped"] == 1
+
+        assert asyncio.run(
+            fronius_api.schedule_battery(tomorrow_plan([-2000, 0, 0, 3000]))
+        )
+        assert fronius_api.get_statistics()["posts"] == 2
+
+    def test_schedules_that_only_differ_by_weekday_are_merged(self):
+        def schedule(weekday_index: int, power: int) -> SolarnetChargeSchedule:
+            return (
+                SolarnetChargeSchedule(power=power)
+                .set_start(time(5))
+                .set_end(time(8))
+                .set_weekday_index(weekday_index)
+            )
+
+        merged = _merge_weekdays(
+            [schedule(0, -2600), schedule(1, -2000), schedule(2, -2600)]
+        )
+        assert [entry.get_weekday_indexes() for entry in merged] == [{0, 2}, {1}]
+        assert [entry.get_power() for entry in merged] == [-2600, -2000]
+
+    def test_slots_with_same_power_are_merged_until_the_power_changes(
+        self, fronius_api: FroniusSolarnetApi
+    ):
+        # Monday
+        start = datetime(2024, 1, 1, 20)
+        powers = [-2000, -2000, 3000, 0, 0]
+        slot_powers = {
+            start + timedelta(hours=hour): _powers_by_schedule_type(power)
+            for hour, power in enumerate(powers)
+        }
+        assert entries(fronius_api._merge_slots(slot_powers)) == [
+            ("CHARGE_MAX", "20:00", "22:00", -2000, (0,)),
+            ("CHARGE_MIN", "20:00", "22:00", -2000, (0,)),
+            ("DISCHARGE_MAX", "00:00", "01:00", 0, (1,)),
+            ("DISCHARGE_MAX", "22:00", "23:00", 3000, (0,)),
+            ("DISCHARGE_MAX", "23:00", "23:59", 0, (0,)),
+            ("DISCHARGE_MIN", "22:00", "23:00", 3000, (0,)),
+        ]
+
+    def test_runs_are_cut_at_midnight_and_merged_by_weekday(
+        self, fronius_api: FroniusSolarnetApi
+    ):
+        start = datetime(2024, 1, 1)
+        slot_powers = {
+            start + timedelta(hours=hour): _powers_by_schedule_type(0)
+            for hour in range(48)
+        }
+        assert entries(fronius_api._merge_slots(slot_powers)) == [
+            ("DISCHARGE_MAX", "00:00", "23:59", 0, (0, 1)),
+        ]
+
+    def test_quarter_hour_slots_are_merged(self, fronius_api: FroniusSolarnetApi):
+        fronius_api.set_slot_minutes(15)
+        start = datetime(2024, 1, 1, 23)
+        slot_powers = {
+            start + timedelta(minutes=15 * slot): _powers_by_schedule_type(-1000)
+            for slot in range(4)
+        }
+        assert entries(fronius_api._merge_slots(slot_powers)) == [
+            ("CHARGE_MAX", "23:00", "23:59", -1000, (0,)),
+            ("CHARGE_MIN", "23:00", "23:59", -1000, (0,)),
+        ]
+
+    def test_only_slots_of_today_are_kept_from_active_schedules(
+        self, fronius_api: FroniusSolarnetApi
+    ):
+        today = date.today()
+        active_schedules = [
+            SolarnetChargeSchedule(datetime.combine(today, time(10)), -1000)
+            .set_end(time(12))
+            .set_weekday_indexes({today.weekday(), (today.weekday() + 1) % 7}),
+            SolarnetChargeSchedule(
+                datetime.combine(today + timedelta(days=2), time(10)), 2000
+            ),
+        ]
+        slot_powers = fronius_api._slot_powers_for_today(active_schedules)
+        assert slot_powers == {
+            datetime.combine(today, time(10)): {"CHARGE_MIN": -1000},
+            datetime.combine(today, time(11)): {"CHARGE_MIN": -1000},
+        }
+
+    def test_one_login_while_the_session_is_valid(
+        self, fronius_api: FroniusSolarnetApi, solarnet: StubSolarnet, clock
+    ):
+        async def test():
+            await fronius_api.get_active_charge_plan()
+            clock[0] += 299
+            await fronius_api.clear()
+            # The session is extended by each request
+            clock[0] += 299
+            await fronius_api.stop()
+
+        asyncio.run(test())
+        assert solarnet.requests == [
+            LOGIN,
+            GET_TIMEOFUSE,
+            POST_TIMEOFUSE,
+            POST_TIMEOFUSE,
+        ]
+        assert fronius_api.get_statistics()["logins"] == 1
+
+    def test_login_again_when_the_session_has_expired(
+        self, fronius_api: FroniusSolarnetApi, solarnet: StubSolarnet, clock
+    ):
+        async def test():
+            await fronius_api.get_active_charge_plan()
+            clock[0] += 301
+            await fronius_api.get_active_charge_plan()
+
+        asyncio.run(test())
+        assert solarnet.requests == [LOGIN, GET_TIMEOFUSE, LOGIN, GET_TIMEOFUSE]
+        statistics = fronius_api.get_statistics()
+        assert statistics["logins"] == 2
+        assert statistics["relogins"] == 0
+
+    @pytest.mark.parametrize("status", [401, 403])
+    def test_login_again_when_a_request_is_rejected(
+        self,
+        fronius_api: FroniusSolarnetApi,
+        solarnet: StubSolarnet,
+        clock,
+        status: int,
+    ):
+        async def test():
+            await fronius_api.get_active_charge_plan()
+            solarnet.rejections = 1
+            solarnet.rejection_status = status
+            assert await fronius_api.clear()
+            await fronius_api.get_active_charge_plan()
+
+        asyncio.run(test())
+        assert solarnet.requests == [
+            LOGIN,
+            GET_TIMEOFUSE,
+            POST_TIMEOFUSE,
+            LOGIN,
+            POST_TIMEOFUSE,
+            GET_TIMEOFUSE,
+        ]
+        statistics = fronius_api.get_statistics()
+        assert statistics["logins"] == 2
+        assert statistics["relogins"] == 1
+
+    def test_other_errors_are_raised_without_login(
+        self, fronius_api: FroniusSolarnetApi, solarnet: StubSolarnet, clock
+    ):
+        solarnet.rejections = 1
+        solarnet.rejection_status = 500
+        with pytest.raises(aiohttp.ClientResponseError):
+            asyncio.run(fronius_api.get_active_charge_plan())
+        assert solarnet.requests == [LOGIN, GET_TIMEOFUSE]
+        assert fronius_api.get_statistics()["relogins"] == 0
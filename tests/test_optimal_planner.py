@@ -0,0 +1,90 @@
+"""OptimalPlanner tests module"""
+
+import random
+
+import pytest
+
+from custom_components.battery_planner.optimal_planner import OptimalPlanner
+from custom_components.battery_planner.planner import _is_feasible
+from custom_components.battery_planner.battery import Battery
+from custom_components.battery_planner.charge_plan import ChargePlan
+from .fixtures import *
+from .test_data import *
+
+
+class TestOptimalPlanner:
+    @pytest.mark.parametrize(
+        "data",
+        [
+            short_price_series_with_1_cycle,
+            short_price_series_with_2_cycles,
+            short_price_series_with_consecutive_charge,
+        ],
+    )
+    def test_finds_same_plan_as_greedy_planner(
+        self, battery_one_kw_two_kwh: Battery, data
+    ):
+        charge_plan: ChargePlan = OptimalPlanner().create_price_arbitrage_plan(
+            battery_one_kw_two_kwh, data["import"], data["export"]
+        )
+        assert charge_plan.expected_yield() == data["yield"]
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            short_price_series_with_3_cycles,
+            long_price_series_with_3_cycles,
+            long_price_series_with_3_cycles_2,
+        ],
+    )
+    def test_yield_is_at_least_as_high_as_greedy_planner(
+        self, planner: Planner, battery_one_kw_one_kwh: Battery, data
+    ):
+        greedy_plan = planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        optimal_plan = OptimalPlanner().create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        assert optimal_plan.expected_yield() >= greedy_plan.expected_yield()
+
+    def test_sell_energy_already_in_battery(self, battery_one_kw_one_kwh: Battery):
+        battery_one_kw_one_kwh.set_energy(1000)
+        battery_one_kw_one_kwh.set_average_charge_cost(1.0)
+        charge_plan = OptimalPlanner().create_price_arbitrage_plan(
+            battery_one_kw_one_kwh, [5.0, 2.0, 4.0, 4.0], [4.0, 1.0, 3.0, 1.0]
+        )
+        assert [hour.get_power() for hour in charge_plan.get_hours_list()] == [
+            1000,
+            -1000,
+            1000,
+            0,
+        ]
+
+    def test_respects_power_and_soc_limits(self):
+        battery = Battery(10000, 3000, 4000, 90, 10)
+        battery.set_soc(50)
+        rng = random.Random(0)
+        import_prices = [rng.uniform(0.5, 3.0) for _ in range(48)]
+        export_prices = [price - 0.2 for price in import_prices]
+        charge_plan = OptimalPlanner(0.1).create_price_arbitrage_plan(
+            battery, import_prices, export_prices
+        )
+        energy = battery.get_energy()
+        for hour in charge_plan.get_hours_list():
+            assert -3000 <= hour.get_power() <= 4000
+            energy -= hour.get_power()
+            assert battery.min_energy_limit() <= energy <= battery.max_energy_limit()
+
+    @pytest.mark.parametrize("energy", [1006, 5006, 8996])
+    def test_energy_between_states_does_not_exceed_limits(self, energy: int):
+        battery = Battery(10000, 3000, 4000, 90, 10)
+        battery.set_energy(energy)
+        battery.set_average_charge_cost(1.0)
+        rng = random.Random(1)
+        import_prices = [rng.uniform(0.5, 3.0) for _ in range(48)]
+        export_prices = [price - 0.2 for price in import_prices]
+        charge_plan = OptimalPlanner(0.1).create_price_arbitrage_plan(
+            battery.clone(), import_prices, export_prices
+        )
+        assert _is_feasible(charge_plan, battery)
@@ -0,0 +1,67 @@
+"""PlanCache tests module"""
+
+from datetime import datetime
+
+from custom_components.battery_planner.battery import Battery
+from custom_components.battery_planner.plan_cache import PlanCache
+from custom_components.battery_planner.planner import Planner, create_empty_plan
+from .fixtures import *
+
+
+class TestPlanCache:
+    def test_cached_plan_is_returned_for_the_same_key(
+        self, battery_one_kw_one_kwh: Battery
+    ):
+        cache = PlanCache()
+        cache.set_start(datetime(2024, 1, 1), 10)
+        key = cache.create_key(battery_one_kw_one_kwh, 10.0, [1.0], [2.0], ())
+        assert cache.get(key) is None
+
+        charge_plan = create_empty_plan(10)
+        cache.put(key, charge_plan)
+        cached_plan = cache.get(key)
+        assert cached_plan is not charge_plan
+        assert cached_plan.get_hours_list()[0].get_index() == 10
+        assert cache.get_statistics() == {"hits": 1, "misses": 1, "size": 1}
+
+    def test_soc_within_tolerance_gives_the_same_key(
+        self, battery_one_kw_one_kwh: Battery
+    ):
+        cache = PlanCache(soc_tolerance=1.0)
+        prices = [1.0, 2.0]
+        key = cache.create_key(battery_one_kw_one_kwh, 10.2, prices, prices, ())
+        assert key == cache.create_key(battery_one_kw_one_kwh, 9.8, prices, prices, ())
+        assert key != cache.create_key(battery_one_kw_one_kwh, 11.0, prices, prices, ())
+        assert key != cache.create_key(
+            battery_one_kw_one_kwh, 10.2, prices, [1.0, 2.1], ()
+        )
+        assert key != cache.create_key(
+            battery_one_kw_one_kwh,
+            10.2,
+            prices,
+            prices,
+            Planner(battery_cycle_cost=1).get_settings(),
+        )
+        assert key != cache.create_key(
+            battery_one_kw_one_kwh, 10.2, prices, prices, (), incremental=True
+        )
+
+    def test_least_recently_used_plan_is_removed(self):
+        cache = PlanCache(max_size=2)
+        cache.set_start(datetime(2024, 1, 1), 0)
+        for key in ["a", "b"]:
+            cache.put(key, create_empty_plan(0, [1.0], [1.0]))
+        cache.get("a")
+        cache.put("c", create_empty_plan(0, [1.0], [1.0]))
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert len(cache) == 2
+
+    def test_cache_is_cleared_when_start_moves(self):
+        cache = PlanCache()
+        cache.set_start(datetime(2024, 1, 1), 10)
+        cache.put("a", create_empty_plan(10, [1.0], [1.0]))
+        cache.set_start(datetime(2024, 1, 1), 10)
+        assert cache.get("a") is not None
+        cache.set_start(datetime(2024, 1, 1), 11)
+        assert cache.get("a") is None
@@ -5,10 +5,15 @@ from typing import Any
 
 import pytest
 
-from custom_components.battery_planner.planner import Planner, create_empty_plan
+from custom_components.battery_planner.planner import (
+    Planner,
+    PlanningCancelled,
+    create_empty_plan,
+)
 from custom_components.battery_planner.battery import Battery
 from custom_components.battery_planner.charge_plan import ChargePlan
 from custom_components.battery_planner.charge_hour import ChargeHour
+from custom_components.battery_planner.time_base import TimeBase
 from .fixtures import *
 from .test_data import *
 
@@ -209,6 +214,119 @@ class TestPlanner:
         )
         verify_plan(data, charge_plan)
 
+    @pytest.mark.parametrize(
+        "data",
+        [
+            long_price_series_start_hour_17_soc_80,
+            long_price_series_start_hour_21_soc_10,
+        ],
+    )
+    def test_repair_plan_one_hour_later(self, data):
+        batt = data["battery"]
+        battery = Battery(
+            batt["capacity"],
+            batt["max_charge_power"],
+            batt["max_discharge_power"],
+            batt["upper_soc_limit"],
+            batt["lower_soc_limit"],
+        )
+        battery.set_soc(batt["soc"])
+        start_hour = int(data["start_hour"])
+        planner = Planner(batt["cycle_cost"])
+        previous_plan = planner.create_price_arbitrage_plan(
+            battery.clone(), data["import"][:40], data["export"][:40], start_hour
+        )
+        energy_after_first_hour = previous_plan.columns().energy_trajectory(
+            battery.get_energy()
+        )[0]
+        battery.set_energy(int(energy_after_first_hour))
+
+        # Same prices and the planned energy level, the rest of the plan is kept
+        charge_plan = planner.repair_plan(
+            previous_plan,
+            battery.clone(),
+            data["import"][:40],
+            data["export"][:40],
+            start_hour + 1,
+        )
+        assert charge_plan.get_first().get_index() == start_hour + 1
+        assert (
+            charge_plan.columns().powers().tolist()
+            == previous_plan.columns().powers().tolist()[1:]
+        )
+
+        # Prices of tomorrow evening are published, the new hours are planned
+        charge_plan = planner.repair_plan(
+            previous_plan,
+            battery.clone(),
+            data["import"],
+            data["export"],
+            start_hour + 1,
+        )
+        assert charge_plan.get_last().get_index() == len(data["import"]) - 1
+
+        # Less energy than planned, discharging is reduced
+        battery.set_energy(int(energy_after_first_hour) - 500)
+        charge_plan = planner.repair_plan(
+            previous_plan,
+            battery.clone(),
+            data["import"][:40],
+            data["export"][:40],
+            start_hour + 1,
+        )
+        assert charge_plan.columns().powers().sum() == (
+            previous_plan.columns().powers()[1:].sum() - 500
+        )
+
+    def test_repair_plan_fails_if_prices_have_changed(
+        self, battery_one_kw_one_kwh: Battery
+    ):
+        previous_plan = Planner().create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), [1.0, 1.0, 5.0], [1.0, 1.0, 5.0]
+        )
+        assert (
+            Planner().repair_plan(
+                previous_plan,
+                battery_one_kw_one_kwh,
+                [1.0, 1.0, 6.0],
+                [1.0, 1.0, 6.0],
+                1,
+            )
+            is None
+        )
+
+    def test_planning_is_skipped_without_price_arbitrage(
+        self, battery_one_kw_one_kwh: Battery
+    ):
+        planner = Planner(battery_cycle_cost=1.0, low_price_threshold=2.0)
+        charge_plan = planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh, [3.0, 1.5, 2.0, 2.5], [3.0, 1.5, 2.0, 2.5]
+        )
+        assert planner.get_statistics() == {
+            "plans": 1,
+            "skipped_without_arbitrage": 1,
+        }
+        # The battery is still charged when the price is below the threshold
+        assert [hour.get_power() for hour in charge_plan.get_hours_list()] == [
+            0,
+            -1000,
+            0,
+            0,
+        ]
+
+        planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.empty_clone(), [3.0, 1.5, 2.6], [3.0, 1.5, 2.6]
+        )
+        assert planner.get_statistics()["skipped_without_arbitrage"] == 1
+
+    def test_planning_is_cancelled(self, battery_one_kw_one_kwh: Battery):
+        planner = Planner()
+        planner.set_cancel_check(lambda: True)
+        with pytest.raises(PlanningCancelled):
+            planner.create_price_arbitrage_plan(
+                battery_one_kw_one_kwh, [1.0, 3.0], [1.0, 3.0]
+            )
+
     def test_create_empty_plan(self):
         charge_plan = create_empty_plan()
         assert charge_plan.is_empty_plan()
@@ -234,6 +352,48 @@ class TestPlanner:
         charge_plan = create_empty_plan(0, [0.0] * 48, [0.0] * 48)
         assert charge_plan.len() == 48
 
+    @pytest.mark.parametrize(
+        "data",
+        [
+            long_price_series_start_hour_18_soc_90,
+            long_price_series_start_hour_21_soc_10,
+        ],
+    )
+    def test_quarter_hour_prices_give_the_same_yield_as_hourly_prices(self, data):
+        batt = data["battery"]
+        battery = Battery(
+            batt["capacity"],
+            batt["max_charge_power"],
+            batt["max_discharge_power"],
+            batt["upper_soc_limit"],
+            batt["lower_soc_limit"],
+        )
+        battery.set_soc(batt["soc"])
+        start_hour = int(data["start_hour"])
+        hourly_plan = Planner(batt["cycle_cost"]).create_price_arbitrage_plan(
+            battery.clone(), data["import"], data["export"], start_hour
+        )
+        quarter_hour_plan = Planner(
+            batt["cycle_cost"], slot_minutes=15
+        ).create_price_arbitrage_plan(
+            battery.clone(),
+            [price for price in data["import"] for _ in range(4)],
+            [price for price in data["export"] for _ in range(4)],
+            start_hour * 4,
+        )
+        assert quarter_hour_plan.len() == 4 * hourly_plan.len()
+        assert quarter_hour_plan.get_first().get_time() == (
+            hourly_plan.get_first().get_time()
+        )
+        assert quarter_hour_plan.expected_yield() == hourly_plan.expected_yield()
+
+    def test_create_empty_plan_with_quarter_hours_ends_tomorrow_23_45(self):
+        charge_plan = create_empty_plan(time_base=TimeBase.today(15))
+        assert charge_plan.len() == 192
+        last_time = charge_plan.get_last().get_time()
+        assert last_time.date() == (datetime.now() + timedelta(days=1)).date()
+        assert (last_time.hour, last_time.minute) == (23, 45)
+
     def test_create_empty_plan_fails_if_price_arrays_are_of_different_lengths(self):
         with pytest.raises(ValueError):
             charge_plan = create_empty_plan(0, [0.0] * 20, [0.0] * 21)
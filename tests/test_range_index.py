@@ -0,0 +1,43 @@
+"""Range index tests module"""
+
+import random
+
+import pytest
+
+from custom_components.battery_planner.range_index import PriceIndex, SparseTable
+
+
+class TestSparseTable:
+    def test_argmin_returns_leftmost_lowest_key(self):
+        table = SparseTable([3.0, 1.0, 2.0, 1.0, 5.0])
+        assert table.argmin(0, 5) == 1
+        assert table.argmin(2, 5) == 3
+        assert table.argmin(4, 5) == 4
+
+    def test_argmin_of_empty_range_raises(self):
+        with pytest.raises(IndexError):
+            SparseTable([1.0, 2.0]).argmin(1, 1)
+
+    def test_iter_sorted_gives_same_order_as_stable_sort(self):
+        rng = random.Random(0)
+        keys = [rng.randint(0, 10) for _ in range(100)]
+        table = SparseTable(keys)
+        for start, end in [(0, 100), (10, 11), (17, 63)]:
+            expected = sorted(range(start, end), key=lambda position: keys[position])
+            assert list(table.iter_sorted(start, end)) == expected
+
+
+class TestPriceIndex:
+    def test_positions_are_ordered_by_price_within_range(self):
+        rng = random.Random(1)
+        import_prices = [rng.randint(0, 10) for _ in range(50)]
+        export_prices = [rng.randint(0, 10) for _ in range(50)]
+        index = PriceIndex(import_prices, export_prices)
+        for start, end in [(0, 50), (5, 20), (30, 30)]:
+            positions = range(start, end)
+            assert list(index.lowest_import_first(start, end)) == sorted(
+                positions, key=lambda position: import_prices[position]
+            )
+            assert list(index.highest_export_first(start, end)) == sorted(
+                positions, key=lambda position: export_prices[position], reverse=True
+            )
@@ -0,0 +1,75 @@
+"""SolarnetChargeSchedule tests module"""
+
+from datetime import date, datetime, time, timedelta
+
+from custom_components.battery_planner.api.fronius_solarnet_api.solarnet_charge_schedule import (
+    SolarnetChargeSchedule,
+)
+
+SCHEDULE_JSON = {
+    "Active": True,
+    "Power": 2600,
+    "ScheduleType": "CHARGE_MIN",
+    "TimeTable": {"Start": "05:00", "End": "08:00"},
+    "Weekdays": {
+        "Mon": True,
+        "Tue": False,
+        "Wed": True,
+        "Thu": False,
+        "Fri": True,
+        "Sat": False,
+        "Sun": False,
+    },
+}
+
+
+class TestSolarnetChargeSchedule:
+    def test_json_round_trip_keeps_weekday_set(self):
+        schedule = SolarnetChargeSchedule.fromjsondict(SCHEDULE_JSON)
+        assert schedule.get_weekday_indexes() == {0, 2, 4}
+        assert schedule.get_weekday_index() == 0
+        assert schedule.get_power() == -2600
+        assert schedule.tojsondict() == SCHEDULE_JSON
+
+    def test_hours_on_all_weekdays_of_the_set(self):
+        schedule = SolarnetChargeSchedule.fromjsondict(SCHEDULE_JSON)
+        hours = schedule.get_hours()
+        assert len(hours) == 9
+        for weekday_index in (0, 2, 4):
+            hours_of_day = [hour for hour in hours if hour.weekday() == weekday_index]
+            assert [hour.time() for hour in hours_of_day] == [
+                time(5),
+                time(6),
+                time(7),
+            ]
+
+    def test_schedule_until_midnight_ends_at_2359(self):
+        start = datetime.combine(date.today(), time(22))
+        schedule = SolarnetChargeSchedule(start, 0, timedelta(hours=2))
+        schedule_json = schedule.tojsondict()
+        assert schedule_json["TimeTable"] == {"Start": "22:00", "End": "23:59"}
+        assert schedule_json["ScheduleType"] == "DISCHARGE_MAX"
+
+        schedule = SolarnetChargeSchedule.fromjsondict(schedule_json)
+        assert schedule.get_hours() == [start, start + timedelta(hours=1)]
+        assert schedule.get_hours(15) == [
+            start + timedelta(minutes=15 * slot) for slot in range(8)
+        ]
+
+    def test_schedule_for_whole_week_until_midnight(self):
+        midnight = datetime.combine(date.today(), time(0))
+        schedule = (
+            SolarnetChargeSchedule(midnight, 0, timedelta(days=1))
+            .set_schedule_type(SolarnetChargeSchedule.SCHEDULE_TYPE_DISCHARGE_MAX)
+            .set_weekday_indexes(SolarnetChargeSchedule.WEEK_DAYS)
+        )
+        schedule_json = schedule.tojsondict()
+        assert schedule_json["TimeTable"] == {"Start": "00:00", "End": "23:59"}
+        assert all(schedule_json["Weekdays"].values())
+
+        hours = SolarnetChargeSchedule.fromjsondict(schedule_json).get_hours()
+        assert len(hours) == 7 * 24
+        assert len(set(hours)) == len(hours)
+        dates = {hour.date() for hour in hours}
+        assert len(dates) == 7
+        assert {midnight.date(), midnight.date() + timedelta(days=1)} <= dates
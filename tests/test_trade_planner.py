@@ -0,0 +1,101 @@
+"""TradePlanner tests module"""
+
+import numpy as np
+import pytest
+
+from custom_components.battery_planner.trade_planner import TradePlanner
+from custom_components.battery_planner.battery import Battery
+from custom_components.battery_planner.charge_plan import ChargePlan
+from custom_components.battery_planner.planner import _is_feasible
+from .fixtures import *
+from .test_data import *
+
+
+class TestTradePlanner:
+    def test_best_trades_are_found_in_time_order(self):
+        prices = np.array([3.0, 1.0, 4.0, 2.0, 5.0, 1.0])
+        planner = TradePlanner()
+        assert planner._best_trades(prices, prices, 2) == [(1, 2), (3, 4)]
+        assert planner._best_trades(prices, prices, 1) == [(1, 4)]
+
+    def test_no_trades_without_profit(self):
+        prices = np.array([5.0, 4.0, 3.0, 2.0])
+        assert TradePlanner()._best_trades(prices, prices, 2) == []
+
+    def test_number_of_cycles_is_limited(self, battery_one_kw_one_kwh: Battery):
+        data = short_price_series_with_2_cycles
+        charge_plan: ChargePlan = TradePlanner(
+            max_daily_cycles=1
+        ).create_price_arbitrage_plan(
+            battery_one_kw_one_kwh, data["import"], data["export"]
+        )
+        charge_hours = [
+            hour for hour in charge_plan.get_hours_list() if hour.get_power() < 0
+        ]
+        assert len(charge_hours) == 1
+
+    def test_cycle_limit_counts_each_calendar_day_of_the_plan(self):
+        # From noon today until noon tomorrow, with one cycle on each day
+        prices = [2.0] * 36
+        prices[13], prices[15], prices[26], prices[28] = 1.0, 3.0, 1.0, 3.0
+        charge_plan = TradePlanner(max_daily_cycles=1).create_price_arbitrage_plan(
+            Battery(1000, 1000, 1000, 100, 0), prices, prices, start_hour=12
+        )
+        assert charge_plan.len() == 24
+        assert [
+            (charge_hour.get_index(), charge_hour.get_power())
+            for charge_hour in charge_plan.get_hours_list()
+            if charge_hour.get_power() != 0
+        ] == [(13, -1000), (15, 1000), (26, -1000), (28, 1000)]
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            short_price_series_with_1_cycle,
+            short_price_series_with_2_cycles,
+            short_price_series_with_3_cycles,
+            long_price_series_with_3_cycles,
+        ],
+    )
+    def test_finds_same_plan_as_greedy_planner(
+        self, battery_one_kw_one_kwh: Battery, data
+    ):
+        charge_plan: ChargePlan = TradePlanner(
+            max_daily_cycles=3
+        ).create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        assert charge_plan.expected_yield() == pytest.approx(data["yield"])
+        assert _is_feasible(charge_plan, battery_one_kw_one_kwh)
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            long_price_series_start_on_hour_21,
+            long_price_series_start_hour_17_soc_80,
+        ],
+    )
+    def test_yield_is_at_least_as_high_as_greedy_planner(
+        self, planner: Planner, battery_one_kw_one_kwh: Battery, data
+    ):
+        greedy_plan = planner.create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        trade_plan = TradePlanner().create_price_arbitrage_plan(
+            battery_one_kw_one_kwh.clone(), data["import"], data["export"]
+        )
+        assert trade_plan.expected_yield() >= greedy_plan.expected_yield()
+
+    def test_energy_already_in_battery_does_not_exceed_upper_soc_limit(self):
+        battery = Battery(15000, 5000, 5000, 100, 5)
+        battery.set_soc(90)
+        battery.set_average_charge_cost(2.0)
+        prices = [0.7, 0.8, 2.7, 1.0, 2.4, 0.3, 1.2, 0.4, 1.5, 2.9, 1.1, 0.2]
+        charge_plan = TradePlanner(0.1, 0.05).create_price_arbitrage_plan(
+            battery.clone(), prices, prices
+        )
+        assert _is_feasible(charge_plan, battery)
+        assert (
+            charge_plan.columns().energy_trajectory(battery.get_energy()).max()
+            <= battery.max_energy_limit()
+        )